@@ -0,0 +1,62 @@
+-- CallGraphite Lua 端辅助函数，供 rplugin 通过 exec_lua 一次调用完成
+local M = {}
+
+local FUNCTION_TYPES = {
+    function_declaration = true,
+    method_declaration = true,
+}
+
+-- 向上查找光标所在的函数节点
+local function current_function_node()
+    local ts_utils = require("nvim-treesitter.ts_utils")
+    local node = ts_utils.get_node_at_cursor()
+    while node and not FUNCTION_TYPES[node:type()] do
+        node = node:parent()
+    end
+    return node
+end
+
+-- 打印光标所在函数的源码，对应 :CaptureFunction
+function M.capture_and_print()
+    local node = current_function_node()
+    if not node then
+        vim.api.nvim_out_write("No function found\n")
+        return false
+    end
+
+    vim.api.nvim_out_write(vim.treesitter.get_node_text(node, 0) .. "\n")
+    return true
+end
+
+-- 一次返回函数源码和光标位置（行列均为 1-based），对应 :CallGraphiteVisualize
+function M.capture_and_locate()
+    local node = current_function_node()
+    local cursor = vim.api.nvim_win_get_cursor(0)
+    return {
+        text = node and vim.treesitter.get_node_text(node, 0) or nil,
+        uri = vim.api.nvim_buf_get_name(0),
+        line = cursor[1],
+        col = cursor[2] + 1,
+    }
+end
+
+-- 同步查询光标处（或 position 处）符号的引用，直接返回合并后的 LSP Location 列表
+function M.get_buf_references(position, timeout_ms)
+    local bufnr = 0
+    local client = vim.lsp.get_active_clients({ bufnr = bufnr })[1]
+    local params = vim.lsp.util.make_position_params(0, client and client.offset_encoding or "utf-8")
+    if position then
+        params.position = position
+    end
+
+    local responses = vim.lsp.buf_request_sync(bufnr, "textDocument/references", params, timeout_ms or 2000)
+    local locations = {}
+    for _, response in pairs(responses or {}) do
+        for _, location in ipairs(response.result or {}) do
+            table.insert(locations, location)
+        end
+    end
+    return locations
+end
+
+return M
@@ -1,12 +1,35 @@
 from __future__ import annotations
 
+import functools
+import logging
+import threading
+from operator import itemgetter
+from typing import TYPE_CHECKING
+
 import pynvim
 from pynvim import command, plugin, function
 
-from .capture import get_current_function_text
 from .log import logger
-from .lua_utils import helpers
-from .traversal import TraversalManager, traverse_project
+from .uri import uri_to_path
+
+if TYPE_CHECKING:
+    from .traversal import TraversalManager
+
+
+@functools.cache
+def _lazy_traversal():
+    """Import the traversal module (and the LLM client) on first use."""
+    from . import traversal
+    return traversal
+
+
+def _warm_graph_ops():
+    """Compile the call-graph kernels in the background so the first visualization is not delayed."""
+    try:
+        from . import graph_ops
+        graph_ops.warmup()
+    except Exception as e:
+        logger.warning("Failed to warm up graph_ops: %s", e)
 
 
 @plugin
@@ -16,60 +39,52 @@ class CallGraphitePlugin:
     def __init__(self, nvim):
         self.nvim: pynvim.Nvim = nvim
         self.manager: TraversalManager | None = None
-        self._callback_registry = {}  # 用于存储回调函数
-        self._next_callback_id = 0    # 用于生成唯一的回调ID
-    
-    def register_callback(self, callback):
-        """注册一个回调函数并返回唯一ID"""
-        callback_id = str(self._next_callback_id)
-        self._callback_registry[callback_id] = callback
-        self._next_callback_id += 1
-        return callback_id
-    
-    def unregister_callback(self, callback_id):
-        """注销回调函数"""
-        if callback_id in self._callback_registry:
-            del self._callback_registry[callback_id]
+        # 装有 numba 时在后台预编译图算法（numba 的 cache=True 会复用磁盘上的编译结果）
+        threading.Thread(target=_warm_graph_ops, name="callgraphite-warmup", daemon=True).start()
 
     @command('CaptureFunction', nargs='0', range='')
     def capture_function(self, args, range):
         """Print the text of the function under the cursor."""
-        text = get_current_function_text(self.nvim)
-        if text:
-            self.nvim.out_write(text + '\n')
-        else:
-            self.nvim.out_write('No function found\n')
+        # 查找、拼接和输出都在 Lua 端完成，只需一次 RPC
+        self.nvim.exec_lua("return require('callgraphite').capture_and_print()")
 
     @command('CallGraphite', nargs='0', range='')
     def call_graphite(self, args, range):
         """Traverse the project and analyse functions via an LLM."""
         logger.info('CallGraphite')
-        
-        # 显示开始消息
-        self.nvim.out_write("CallGraphite: Starting analysis...\n")
-        
-        # 设置状态栏消息
-        self.nvim.command('let &statusline = "%#StatusLine#CallGraphite: Analyzing...%="')
-        
+        from .lua_utils import helpers
+
+        # 保存原状态栏，设置分析中的状态栏并显示开始消息（一次 RPC）
+        old_statusline = self.nvim.api.get_option_value('statusline', {})
+        helpers.call_atomic(self.nvim, [
+            ["nvim_set_option_value", ['statusline', '%#StatusLine#CallGraphite: Analyzing...%=', {}]],
+            ["nvim_out_write", ["CallGraphite: Starting analysis...\n"]],
+        ])
+        restore_statusline = ["nvim_set_option_value", ['statusline', old_statusline, {}]]
+
         try:
             # 使用遍历管理器
-            self.manager = traverse_project(self.nvim, self)
-            
-            # 恢复状态栏
-            self.nvim.command('let &statusline = &statusline')
-            
-            # 显示完成消息
-            self.nvim.out_write("CallGraphite: Analysis complete!\n")
+            self.manager = _lazy_traversal().traverse_project(self.nvim, self)
+
+            # 恢复状态栏并显示完成消息
+            helpers.call_atomic(self.nvim, [
+                restore_statusline,
+                ["nvim_out_write", ["CallGraphite: Analysis complete!\n"]],
+            ])
         except Exception as e:
             # 处理错误
-            logger.exception(f"Error in CallGraphite: {e}")
-            self.nvim.err_write(f"CallGraphite error: {e}\n")
-            
-            # 恢复状态栏
-            self.nvim.command('let &statusline = &statusline')
-        
-        # 记录函数体，用于调试
-        logger.info('CallGraphite, func body: %s', helpers.run_get_current_function_body(self.nvim))
+            logger.exception("Error in CallGraphite: %s", e)
+
+            # 恢复状态栏并显示错误
+            helpers.call_atomic(self.nvim, [
+                restore_statusline,
+                ["nvim_err_write", [f"CallGraphite error: {e}\n"]],
+            ])
+
+        # 记录函数体，用于调试；日志级别不输出 INFO 时跳过这次 RPC
+        if logger.isEnabledFor(logging.INFO):
+            body = helpers.run_get_current_function_body(self.nvim)
+            logger.info('CallGraphite, func body: %s', body and body.get_content())
 
     @command('CallGraphiteBack', nargs='0', range='')
     def call_graphite_back(self, args, range):
@@ -85,72 +100,76 @@ class CallGraphitePlugin:
 
     @function("_graphite_response", sync=False)
     def handle_graphite_response(self, args):
+        # 供外部调用方把位置列表填入 quickfix；立即返回，实际处理调度到主循环，避免阻塞 RPC 事件处理
+        self.nvim.async_call(self._finish_response, args)
+
+    def _finish_response(self, args):
         try:
             logger.info("CallGraphite response: %s", args)
-            data = args[0].get('data', {})
-            callback_id = args[0].get('callback_id')
-            
-            if callback_id and callback_id in self._callback_registry:
-                # 执行注册的回调函数
-                callback = self._callback_registry[callback_id]
-                callback(data)
-                # 执行完后注销回调
-                self.unregister_callback(callback_id)
-            else:
-                # 默认行为：填充 quickfix 列表
-                self.populate_quickfix(self.nvim, data)
+            data = args[0].get('data') or ()
+            if data:
+                # 按文件排序后填充 quickfix 列表
+                self.populate_quickfix(self.nvim, sorted(data, key=itemgetter('uri')))
         except Exception as e:
-            logger.exception(f"Error in handle_graphite_response: {e}")
+            logger.exception("Error in handle_graphite_response: %s", e)
+            self.nvim.err_write(f"CallGraphite error: {e}\n")
 
     @staticmethod
-    def jump_to_location(nvim, location):
-        uri = location["uri"]
-        path = uri.replace("file://", "")
-        line = location["range"]["start"]["line"] + 1  # 1-based in Vim
-        col = location["range"]["start"]["character"] + 1
+    def _jump_calls(location) -> list:
+        """Build the ``nvim_call_atomic`` calls that jump to ``location``."""
+        path = uri_to_path(location["uri"])
+        start = location["range"]["start"]
+        line = start["line"] + 1  # 1-based in Vim
+        col = start["character"]  # nvim_win_set_cursor 的列是 0-based
+
+        # 结构化的 nvim_cmd 不经过命令行解析，路径中的空格也无需转义
+        return [
+            ["nvim_cmd", [{"cmd": "edit", "args": [path]}, {}]],
+            ["nvim_win_set_cursor", [0, [line, col]]],
+        ]
 
-        nvim.command(f"edit {path}")
-        nvim.call("cursor", line, col)
+    @staticmethod
+    def jump_to_location(nvim, location):
+        from .lua_utils import helpers
+        helpers.call_atomic(nvim, CallGraphitePlugin._jump_calls(location))
 
     @staticmethod
     def populate_quickfix(nvim, locations):
-        qf_list = []
-        for loc in locations:
-            uri = loc["uri"]
-            path = uri.replace("file://", "")
-            line = loc["range"]["start"]["line"] + 1
-            col = loc["range"]["start"]["character"] + 1
-            qf_list.append({
-                "filename": path,
-                "lnum": line,
-                "col": col,
-                "text": f"{path}:{line}:{col}"
-            })
-            # 修复这里的bug，使用loc而不是loc[1]
-            CallGraphitePlugin.jump_to_location(nvim, loc)
-            break
-
-        # 取消注释这些行，启用quickfix列表
-        nvim.call("setqflist", qf_list, 'r')
-        nvim.command("copen")
-
-
-    @pynvim.command('CallGraphiteVisualize', nargs='*', range='', sync=True)
+        from .lua_utils import helpers
+        if not locations:
+            return
+
+        # 所有引用都放入 quickfix 列表
+        qf_list = [
+            {"filename": path, "lnum": line, "col": col, "text": f"{path}:{line}:{col}"}
+            for path, line, col in (
+                (uri_to_path(loc["uri"]), loc["range"]["start"]["line"] + 1, loc["range"]["start"]["character"] + 1)
+                for loc in locations
+            )
+        ]
+        # 跳转到第一个位置
+        calls = CallGraphitePlugin._jump_calls(locations[0])
+
+        # 跳转、填充 quickfix 列表并打开窗口，合并为一次 RPC
+        calls.append(["nvim_call_function", ["setqflist", [qf_list, 'r']]])
+        calls.append(["nvim_command", ["copen"]])
+        helpers.call_atomic(nvim, calls)
+
+    @command('CallGraphiteVisualize', nargs='*', range='', sync=True)
     def visualize_call_graph(self, args, range):
         """Generate and display call graph visualization for the current function."""
         try:
-            # 获取当前函数文本
-            source = get_current_function_text(self.nvim)
+            # 一次 RPC 获取当前函数文本和光标位置
+            location = self.nvim.exec_lua("return require('callgraphite').capture_and_locate()")
+            source = location.get("text")
             if not source:
                 self.nvim.command('echo "No function found at cursor position"')
                 return
 
             # 创建遍历管理器
-            traversal = TraversalManager(self.nvim)
+            traversal = _lazy_traversal().TraversalManager(self.nvim, self)
 
-            # 获取当前位置
-            uri, line, col = traversal._cursor_location()
-            symbol = f"{uri}:{line}:{col}"
+            symbol = f"{location['uri']}:{location['line']}:{location['col']}"
 
             # 分析函数并生成可视化
             traversal.visit_function(symbol, source)
@@ -160,5 +179,5 @@ class CallGraphitePlugin:
 
             self.nvim.command('echo "Call graph visualization generated"')
         except Exception as e:
-            logger.error(f"Error in visualize_call_graph: {e}")
+            logger.error("Error in visualize_call_graph: %s", e)
             self.nvim.command(f'echoerr "Error generating visualization: {str(e)}"')
@@ -0,0 +1,113 @@
+"""Persistent cache for LLM analysis results."""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from . import jsonutil
+from .log import logger
+
+CACHE_PATH = "~/.cache/callgraphite/llm.sqlite3"
+
+
+class AnalysisCache:
+    """Store analysis results in SQLite so they survive Neovim restarts.
+
+    Keys are expected to be stable digests (see ``LLMClient._cache_key``);
+    entries expire after ``expire`` seconds. Recently used entries are also
+    kept in a bounded in-memory LRU of ``max_entries`` items, so hot lookups
+    skip SQLite and memory stays bounded in long sessions. The cache is
+    shared by the LLM worker threads, so every access goes through a lock.
+    """
+
+    def __init__(self, path: str | None = CACHE_PATH, expire: float = 7 * 86400,
+                 max_entries: int = 2048) -> None:
+        """Open the cache database; ``path=None`` keeps only the in-memory LRU."""
+        self.expire = expire
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # key -> (value, expires)
+        self._lru: OrderedDict[str, Tuple[Dict[str, Any], float]] = OrderedDict()
+        self._conn = self._connect(path)
+
+    @staticmethod
+    def _connect(path: str | None) -> Optional[sqlite3.Connection]:
+        if path is None:
+            return None
+        path = os.path.expanduser(path)
+        conn = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            # 损坏的数据库文件在第一次执行语句时才会报错，建表和清理也放在这里
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analysis (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            # 打开时清理过期条目，避免数据库无限增长
+            conn.execute("DELETE FROM analysis WHERE expires <= ?", (time.time(),))
+            return conn
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("Cannot open analysis cache %s, using memory: %s", path, e)
+            if conn is not None:
+                conn.close()
+            return None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result for ``key`` or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._lru.move_to_end(key)
+                    return entry[0]
+                del self._lru[key]
+            if self._conn is None:
+                return None
+            try:
+                row = self._conn.execute(
+                    "SELECT value, expires FROM analysis WHERE key = ? AND expires > ?", (key, now)
+                ).fetchone()
+            except sqlite3.Error as e:
+                # 数据库被锁定或损坏时按未命中处理
+                logger.warning("Analysis cache read failed: %s", e)
+                return None
+            if row is None:
+                return None
+            value = jsonutil.loads(row[0])
+            self._remember(key, value, row[1])
+        return value
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Store ``value`` under ``key``."""
+        expires = time.time() + self.expire
+        with self._lock:
+            self._remember(key, value, expires)
+            if self._conn is None:
+                return
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO analysis (key, value, expires) VALUES (?, ?, ?)",
+                    (key, jsonutil.dumps(value), expires),
+                )
+            except sqlite3.Error as e:
+                # 写入失败时结果仍保留在内存 LRU 中
+                logger.warning("Analysis cache write failed: %s", e)
+
+    def _remember(self, key: str, value: Dict[str, Any], expires: float) -> None:
+        """Put an entry in the LRU, evicting the least recently used one when full."""
+        self._lru[key] = (value, expires)
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._lru.clear()
+            if self._conn is not None:
+                self._conn.close()
@@ -1,10 +1,26 @@
 # -*- coding: utf-8 -*-
 """Utilities for extracting source code from the current buffer."""
 from __future__ import annotations
-from typing import Optional
+from typing import Dict, Optional, Tuple
 from pynvim import Nvim
 
-from .lua_utils.helpers import run_get_current_function_body
+from .lua_utils.helpers import call_atomic, run_get_current_function_body
+
+# bufnr -> (changedtick, (start_row, start_col, end_row, end_col), text)
+_FUNCTION_CACHE: Dict[int, Tuple[int, Tuple[int, int, int, int], str]] = {}
+
+
+def _cursor_state(nvim: Nvim) -> Tuple[int, int, int, int]:
+    """Return ``(bufnr, changedtick, row, col)`` of the cursor in one RPC.
+
+    ``row`` and ``col`` are 0-based, matching tree-sitter ranges.
+    """
+    bufnr, changedtick, (row, col) = call_atomic(nvim, [
+        ["nvim_call_function", ["bufnr", []]],
+        ["nvim_buf_get_changedtick", [0]],
+        ["nvim_win_get_cursor", [0]],
+    ])
+    return bufnr, changedtick, row - 1, col
 
 
 def get_current_function_text(nvim: Nvim) -> Optional[str]:
@@ -13,7 +29,26 @@ def get_current_function_text(nvim: Nvim) -> Optional[str]:
     The implementation relies on tree-sitter to locate the nearest parent
     function node and then extracts the lines for that range. This function
     uses the Lua implementation in get_current_function_body.lua.
+
+    The result is cached per buffer: as long as ``b:changedtick`` is unchanged
+    and the cursor stays inside the cached function, the Lua script is not run
+    again.
     """
-    # 使用task_id=0，因为我们不需要异步回调
-    return run_get_current_function_body(nvim)
+    bufnr, changedtick, row, col = _cursor_state(nvim)
+    cached = _FUNCTION_CACHE.get(bufnr)
+    if cached is not None:
+        cached_tick, (sr, sc, er, ec), text = cached
+        if cached_tick == changedtick and (sr, sc) <= (row, col) < (er, ec):
+            return text
+
+    body = run_get_current_function_body(nvim)
+    if body is None:
+        return None
 
+    text = body.get_content()
+    _FUNCTION_CACHE[bufnr] = (
+        changedtick,
+        (body.start_row, body.start_col, body.end_row, body.end_col),
+        text,
+    )
+    return text
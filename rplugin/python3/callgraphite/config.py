@@ -1,8 +1,12 @@
 """Configuration management for CallGraphite."""
-import json
+import copy
+import functools
 import os
+from pathlib import Path
 from typing import Dict, Any
 
+from . import jsonutil
+
 
 def default_config() -> dict:
     """Return the default configuration."""
@@ -12,7 +16,11 @@ def default_config() -> dict:
             "api_key": "",  # 用户需要设置自己的API密钥
             "model": "deepseek-chat",
             "temperature": 0.3,
-            "max_tokens": 4096
+            "max_tokens": 256,
+            "comprehensive_max_tokens": 1024,  # 综合分析的输出更长，单独设置上限
+            # DeepSeek 只支持 json_object；OpenAI 等支持结构化输出的服务可设为 json_schema
+            "response_format": "json_object",
+            "stream": True  # 流式接收响应，JSON 对象完整后立即返回
         },
         "visualization": {
             "enabled": True,
@@ -34,12 +42,14 @@ def load_config() -> Dict[str, Any]:
 
     # 尝试从文件加载
     config_path = os.path.expanduser("~/.config/callgraphite/config.json")
-    if os.path.exists(config_path):
+    try:
+        mtime = os.path.getmtime(config_path)
+    except OSError:
+        mtime = None
+    if mtime is not None:
         try:
-            with open(config_path, 'r') as f:
-                file_config = json.load(f)
-                # 递归更新配置
-                _update_dict(config, file_config)
+            # 递归更新配置；拷贝一份，避免调用方修改缓存的内容
+            _update_dict(config, copy.deepcopy(_read_config_file(config_path, mtime)))
         except Exception as e:
             print(f"Error loading config file: {e}")
 
@@ -52,10 +62,19 @@ def load_config() -> Dict[str, Any]:
     return config
 
 
+@functools.lru_cache(maxsize=1)
+def _read_config_file(config_path: str, mtime: float) -> Dict[str, Any]:
+    """Parse the config file; the result is reused until its mtime changes."""
+    return jsonutil.loads(Path(config_path).read_bytes())
+
+
 def _update_dict(target: Dict, source: Dict) -> None:
-    """递归更新字典，保留嵌套结构。"""
-    for key, value in source.items():
-        if key in target and isinstance(target[key], dict) and isinstance(value, dict):
-            _update_dict(target[key], value)
-        else:
-            target[key] = value
+    """递归更新字典，保留嵌套结构（使用显式栈代替递归）。"""
+    stack = [(target, source)]
+    while stack:
+        t, s = stack.pop()
+        for key, value in s.items():
+            if isinstance(value, dict) and isinstance(t.get(key), dict):
+                stack.append((t[key], value))
+            else:
+                t[key] = value
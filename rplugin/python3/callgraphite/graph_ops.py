@@ -0,0 +1,166 @@
+"""Call graph post-processing (strongly connected components) over integer adjacency arrays."""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Sequence, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy 是可选依赖，缺失时使用普通列表
+    np = None
+
+try:
+    from numba import njit
+except ImportError:  # numba 是可选依赖，缺失时以纯 Python 运行同一份代码
+    njit = None
+
+# numba 只能编译 numpy 数组上的循环，两者都安装时才启用 JIT
+HAVE_NUMBA = njit is not None and np is not None
+
+if not HAVE_NUMBA:
+    def njit(*args, **kwargs):
+        """No-op replacement for ``numba.njit(...)``."""
+        return lambda func: func
+
+
+def _array(values: Sequence[int]):
+    """Return ``values`` as an int32 array when numpy is available, else a list."""
+    if np is not None:
+        return np.asarray(values, dtype=np.int32)
+    return list(values)
+
+
+def _full(n: int, value: int):
+    if np is not None:
+        return np.full(n, value, dtype=np.int32)
+    return [value] * n
+
+
+def to_csr(call_graph: Dict[str, Dict[str, Any]]) -> Tuple[List[str], Any, Any]:
+    """Convert ``{symbol: {"calls": [...]}}`` to ``(symbols, indptr, indices)`` CSR arrays.
+
+    Callees that never appear as keys still get an id, so every edge has both endpoints.
+    """
+    ids: Dict[str, int] = {}
+    symbols: List[str] = []
+    for symbol in call_graph:
+        ids[symbol] = len(symbols)
+        symbols.append(symbol)
+
+    indptr = [0]
+    indices: List[int] = []
+    for symbol in call_graph:
+        for call in call_graph[symbol].get("calls", ()):
+            node = ids.get(call)
+            if node is None:
+                node = ids[call] = len(symbols)
+                symbols.append(call)
+            indices.append(node)
+        indptr.append(len(indices))
+    # 只作为被调用方出现的节点没有出边
+    indptr.extend([len(indices)] * (len(symbols) - len(call_graph)))
+    return symbols, _array(indptr), _array(indices)
+
+
+@njit(cache=True)
+def _tarjan(indptr, indices, n, index, low, comp, on_stack, stack, call_stack, edge_pos):
+    """Iterative Tarjan; fills ``comp`` with a component id per node and returns the component count.
+
+    All work arrays are preallocated by the caller (``index``/``comp`` set to -1, the rest to 0)
+    so the same code runs under numba and as plain Python.
+    """
+    counter = 0
+    n_comp = 0
+    sp = 0  # stack 的长度
+    for root in range(n):
+        if index[root] != -1:
+            continue
+        csp = 0  # call_stack 的长度
+        call_stack[csp] = root
+        csp += 1
+        index[root] = counter
+        low[root] = counter
+        counter += 1
+        stack[sp] = root
+        sp += 1
+        on_stack[root] = 1
+        edge_pos[root] = indptr[root]
+        while csp > 0:
+            v = call_stack[csp - 1]
+            if edge_pos[v] < indptr[v + 1]:
+                w = indices[edge_pos[v]]
+                edge_pos[v] += 1
+                if index[w] == -1:
+                    index[w] = counter
+                    low[w] = counter
+                    counter += 1
+                    stack[sp] = w
+                    sp += 1
+                    on_stack[w] = 1
+                    edge_pos[w] = indptr[w]
+                    call_stack[csp] = w
+                    csp += 1
+                elif on_stack[w] == 1 and index[w] < low[v]:
+                    low[v] = index[w]
+            else:
+                csp -= 1
+                if csp > 0:
+                    parent = call_stack[csp - 1]
+                    if low[v] < low[parent]:
+                        low[parent] = low[v]
+                if low[v] == index[v]:
+                    # v 是一个强连通分量的根，弹出整个分量
+                    while True:
+                        sp -= 1
+                        w = stack[sp]
+                        on_stack[w] = 0
+                        comp[w] = n_comp
+                        if w == v:
+                            break
+                    n_comp += 1
+    return n_comp
+
+
+def tarjan_scc(indptr, indices, n: int):
+    """Return ``(component ids, component count)`` for a CSR graph with ``n`` nodes."""
+    comp = _full(n, -1)
+    count = _tarjan(indptr, indices, n, _full(n, -1), _full(n, 0), comp,
+                    _full(n, 0), _full(n, 0), _full(n, 0), _full(n, 0))
+    return comp, count
+
+
+def scc_components(call_graph: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+    """Return a strongly connected component id for every symbol in ``call_graph``.
+
+    Tarjan emits components in reverse topological order, so a component's id is always
+    larger than the ids of the components it calls.
+    """
+    symbols, indptr, indices = to_csr(call_graph)
+    if not symbols:
+        return {}
+    comp, _ = tarjan_scc(indptr, indices, len(symbols))
+    return {symbol: int(c) for symbol, c in zip(symbols, comp)}
+
+
+def recursive_symbols(call_graph: Dict[str, Dict[str, Any]]) -> Set[str]:
+    """Return the symbols that take part in recursion (a cycle or a direct self-call)."""
+    symbols, indptr, indices = to_csr(call_graph)
+    n = len(symbols)
+    if n == 0:
+        return set()
+    comp, count = tarjan_scc(indptr, indices, n)
+
+    sizes = [0] * int(count)
+    for c in comp:
+        sizes[int(c)] += 1
+    recursive = {symbols[v] for v in range(n) if sizes[int(comp[v])] > 1}
+    for v in range(n):
+        for e in range(int(indptr[v]), int(indptr[v + 1])):
+            if int(indices[e]) == v:
+                recursive.add(symbols[v])
+    return recursive
+
+
+def warmup() -> None:
+    """Compile (or load from numba's on-disk cache) the JIT kernels on a tiny graph."""
+    if HAVE_NUMBA:
+        recursive_symbols({"a": {"calls": ["a"]}})
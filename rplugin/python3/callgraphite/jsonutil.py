@@ -0,0 +1,23 @@
+"""JSON helpers that use orjson when it is installed."""
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson 是可选依赖，缺失时退回标准库
+    orjson = None
+
+
+def loads(data):
+    """Decode a JSON document given as ``str`` or ``bytes``."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj, indent: bool = False) -> str:
+    """Encode ``obj`` as a JSON string, indented by two spaces or fully compact."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode()
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
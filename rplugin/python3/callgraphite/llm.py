@@ -1,16 +1,208 @@
 """Abstractions for interacting with a language model service."""
 from __future__ import annotations
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import atexit
+import hashlib
 import os
-import json
+import re
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from . import jsonutil
+from .cache import AnalysisCache
 from .log import logger
 from .config import load_config
 
+# 提示词变更时递增，使旧的缓存结果失效
+PROMPT_VERSION = "v1"
+
+
+# 用于归一化源码的正则：行注释、块注释和连续空白
+_LINE_COMMENT_RE = re.compile(r"^[ \t]*(?://|#).*$", re.MULTILINE)
+_BLOCK_COMMENT_RE = re.compile(r"/\*.*?\*/", re.DOTALL)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+class _JsonObjectScanner:
+    """Track brace depth over streamed text to detect when the top-level JSON object is complete."""
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, text: str) -> bool:
+        """Consume ``text``; return True once the first top-level ``{...}`` has closed."""
+        return self.scan(text) >= 0
+
+    def scan(self, text: str, start: int = 0) -> int:
+        """Consume ``text[start:]``; return the index just past the closing brace, or -1."""
+        for i in range(start, len(text)):
+            char = text[i]
+            if self.in_string:
+                # 字符串内的大括号不计入深度
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = self.started
+            elif char == "{":
+                self.depth += 1
+                self.started = True
+            elif char == "}" and self.started:
+                self.depth -= 1
+                if self.depth == 0:
+                    return i + 1
+        return -1
+
+
+def _iter_json_objects(text: str):
+    """Yield every balanced ``{...}`` span in ``text``, outermost first."""
+    start = text.find("{")
+    while start >= 0:
+        end = _JsonObjectScanner().scan(text, start)
+        # 未闭合的 "{"（例如说明文字中的孤立括号）不影响后面的候选对象
+        if end >= 0:
+            yield text[start:end]
+        start = text.find("{", start + 1)
+
+
+# 综合分析提示中子调用部分的长度限制，超出时先去掉最长的子调用
+MAX_PROMPT_CHARS = 12000
+_SUBCALL_SUMMARY_CHARS = 300
+_SUBCALL_KEY_OPERATIONS = 3
+
+
+def compact_prompt_json(prompt_data: Dict[str, Any], subcalls_key: str, max_chars: int = MAX_PROMPT_CHARS) -> str:
+    """Serialize ``prompt_data`` compactly, keeping only what the model needs from each subcall.
+
+    Each entry under ``subcalls_key`` is reduced to a truncated summary and its first key
+    operations; if the result is still longer than ``max_chars``, the longest entries are dropped.
+    """
+    subcalls = {
+        symbol: {
+            "summary": (analysis.get("summary") or "")[:_SUBCALL_SUMMARY_CHARS],
+            "key_operations": analysis.get("key_operations", [])[:_SUBCALL_KEY_OPERATIONS],
+        }
+        for symbol, analysis in prompt_data.get(subcalls_key, {}).items()
+    }
+    data = {**prompt_data, subcalls_key: subcalls}
+    text = jsonutil.dumps(data)
+
+    excess = len(text) - max_chars
+    if excess > 0:
+        sizes = {symbol: len(jsonutil.dumps({symbol: entry})) for symbol, entry in subcalls.items()}
+        for symbol in sorted(sizes, key=sizes.get, reverse=True):
+            if excess <= 0:
+                break
+            del subcalls[symbol]
+            excess -= sizes[symbol]
+        text = jsonutil.dumps(data)
+    return text
+
+
+def normalize_source(source: str) -> str:
+    """Strip comments and collapse whitespace so near-identical functions share a cache entry."""
+    source = _BLOCK_COMMENT_RE.sub(" ", source)
+    source = _LINE_COMMENT_RE.sub("", source)
+    return _WHITESPACE_RE.sub(" ", source).strip()
+
+
+# 初步分析使用的系统提示
+ANALYSIS_SYSTEM_PROMPT = """
+            You are a code analysis assistant. 
+            Analyze the provided function and identify:
+            1. Function calls made within the code (exclude logging calls like log.info, print, console.log and language built-in functions like len, str, int, append, etc.)
+            2. Global variables accessed (exclude language constants and built-in variables)
+            3. Key operations performed (focus on business logic, data processing, and algorithmic operations)
+            4. A brief summary of what the function does
+            5. The data flow within the function
+            
+            EXCLUSIONS - Do NOT include:
+            - Logging functions (log.*, print, console.log, fmt.Printf, etc.)
+            - Language built-ins with clear semantics (len, str, int, append, range, etc.)
+            - Standard library functions with obvious purposes (json.loads, os.path.join, etc.)
+            - Error handling keywords (try, catch, throw, panic, etc.)
+            - Control flow keywords (if, for, while, return, break, continue, etc.)
+            
+            FOCUS ON:
+            - Custom/user-defined function calls
+            - External API calls
+            - Database operations
+            - File I/O operations (beyond basic open/close)
+            - Complex data transformations
+            - Business logic functions
+            
+            EXAMPLE JSON OUTPUT:
+            {
+                "function_calls": ["calculateTax", "sendNotification", "validateUser"], 
+                "global_vars": ["CONFIG_TIMEOUT", "DATABASE_URL"], 
+                "key_operations": ["validates user credentials", "calculates tax based on income brackets", "sends email notification"],
+                "summary": "Processes user tax calculation request and sends notification",
+                "data_flow": "Takes user input -> validates credentials -> calculates tax -> stores result -> sends notification"
+            }
+"""
+
+# 分析结果的 JSON Schema，供支持结构化输出（response_format=json_schema）的服务使用
+_STRING_ARRAY = {"type": "array", "items": {"type": "string"}}
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "function_calls": _STRING_ARRAY,
+        "global_vars": _STRING_ARRAY,
+        "key_operations": _STRING_ARRAY,
+        "summary": {"type": "string"},
+        "data_flow": {"type": "string"},
+    },
+    "required": ["function_calls", "global_vars", "key_operations", "summary", "data_flow"],
+    "additionalProperties": False,
+}
+BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {"results": {"type": "array", "items": ANALYSIS_SCHEMA}},
+    "required": ["results"],
+    "additionalProperties": False,
+}
+
+# 批量分析时追加的输出格式说明
+BATCH_SYSTEM_PROMPT = ANALYSIS_SYSTEM_PROMPT + """
+            You will receive several functions, each introduced by a "### FUNCTION <i>" header.
+            Analyze every function independently and respond with a JSON object of the form
+            {"results": [<analysis of FUNCTION 0>, <analysis of FUNCTION 1>, ...]}
+            where each element has the same structure as the example above and the array
+            keeps the order of the input functions.
+            """
+
+
+# 综合分析使用的系统提示
+COMPREHENSIVE_SYSTEM_PROMPT = """You are a code analysis assistant. 
+        Based on the function source code and its subcalls' analysis results, provide a comprehensive summary.
+        Focus on how the function orchestrates its subcalls and the overall data flow.
+        
+        Respond in JSON format with the following structure:
+        {
+            "function_calls": ["function1", "function2"], 
+            "global_vars": ["var1", "var2"], 
+            "key_operations": ["description1", "description2"],
+            "summary": "Overall description of what the function does",
+            "data_flow": "Description of how data flows through this function and its subcalls"
+        }
+        """
+
 
 class LLMClient:
     """Client used to send prompts to a language model service."""
 
+    # 系统消息在所有请求间保持逐字节一致，便于服务端的前缀缓存命中
+    _ANALYSIS_SYSTEM_MSG = {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT}
+    _BATCH_SYSTEM_MSG = {"role": "system", "content": BATCH_SYSTEM_PROMPT}
+    _COMPREHENSIVE_SYSTEM_MSG = {"role": "system", "content": COMPREHENSIVE_SYSTEM_PROMPT}
+
     # 在文件顶部添加导入
     from .config import load_config
 
@@ -24,23 +216,75 @@ class LLMClient:
         """
         config = load_config()
         llm_config = config.get("llm", {})
+        # 构造时使用的配置，get_default_client() 据此判断配置文件是否已修改
+        self.config_snapshot = _client_config(config)
 
         self.endpoint = endpoint or llm_config.get("endpoint") or "https://api.openai.com/v1/chat/completions"
         self.api_key = api_key or llm_config.get("api_key") or os.environ.get("OPENAI_API_KEY")
         self.model = llm_config.get("model") or "gpt-3.5-turbo"
         self.temperature = llm_config.get("temperature", 0.3)
-        self.max_tokens = llm_config.get("max_tokens", 500)
+        self.max_tokens = llm_config.get("max_tokens", 256)
+        # 综合分析需要汇总子调用结果，输出比单个函数分析长得多
+        self.comprehensive_max_tokens = llm_config.get("comprehensive_max_tokens", 1024)
+        # "json_schema" 使用严格的结构化输出，"json_object" 只要求返回 JSON
+        self.response_format = llm_config.get("response_format", "json_object")
+        # 是否使用 SSE 流式响应
+        self.stream = llm_config.get("stream", True)
+        # 同时进行的 LLM 请求数上限
+        self.max_concurrency = llm_config.get("max_concurrency", 8)
+        # 一次批量请求中最多包含的函数数量
+        self.max_batch_size = llm_config.get("max_batch_size", 8)
+
+        # 缓存已分析的函数，避免重复请求；cache_results 关闭或没有 API 密钥（模拟响应）时只保存在内存中
+        persist = config.get("analysis", {}).get("cache_results", True) and self.api_key
+        self.cache = AnalysisCache() if persist else AnalysisCache(path=None)
+
+        # 复用 HTTP 连接（keep-alive），避免每次请求都重新握手
+        self._session = requests.Session()
+        retry = Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=frozenset(["POST"]),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=retry)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._session.headers["Content-Type"] = "application/json"
+        if self.api_key:
+            self._session.headers["Authorization"] = f"Bearer {self.api_key}"
+        self._executor: Optional[ThreadPoolExecutor] = None
 
-        # 缓存已分析的函数，避免重复请求
-        self.cache: Dict[int, Any] = {}
+    def close(self) -> None:
+        """Release the pooled HTTP connections and worker threads."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._session.close()
+        self.cache.close()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Return the thread pool used for concurrent LLM requests."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency, thread_name_prefix="callgraphite-llm"
+            )
+        return self._executor
+
+    def __enter__(self) -> LLMClient:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
 
     def analyse_function(self, source: str) -> Dict[str, Any]:
         """初步分析函数，识别关键调用和变量。"""
         # 检查缓存
-        cache_key = hash(source)
-        if cache_key in self.cache:
+        cached = self._cached(source)
+        if cached is not None:
             logger.info("Using cached analysis for function")
-            return self.cache[cache_key]
+            return cached
 
         # 构建提示
         prompt = self._build_analysis_prompt(source)
@@ -49,18 +293,70 @@ class LLMClient:
             # 调用LLM API
             response = self._call_llm_api(prompt)
 
-            # 解析响应
+            # 解析响应；无法解析（例如输出被截断）时返回后备结果，但不写入缓存
             result = self._parse_analysis_response(response)
+            if result is None:
+                return self._fallback_analysis(response)
 
             # 缓存结果
-            self.cache[cache_key] = result
+            self._store(source, result)
 
             return result
         except Exception as e:
-            logger.error(f"Error analyzing function: {e}")
+            logger.error("Error analyzing function: %s", e)
             # 返回空结果作为后备
             return {"function_calls": [], "global_vars": [], "key_operations": []}
 
+    def analyse_functions(self, sources: List[str]) -> List[Dict[str, Any]]:
+        """并发地初步分析多个函数，返回结果的顺序与 ``sources`` 一致。"""
+        # 相同的源码只请求一次
+        unique = list(dict.fromkeys(sources))
+        if len(unique) <= 1:
+            results = [self.analyse_function(source) for source in unique]
+        else:
+            results = list(self._get_executor().map(self.analyse_function, unique))
+        by_source = dict(zip(unique, results))
+        return [by_source[source] for source in sources]
+
+    def analyse_functions_batch(self, sources: List[str]) -> List[Dict[str, Any]]:
+        """批量初步分析多个函数，返回结果的顺序与 ``sources`` 一致。
+
+        未命中缓存的源码每 ``max_batch_size`` 个合并为一次请求，共享系统提示和网络往返；
+        多个批次并发发送。响应无法按函数拆分时，退回到逐个分析。
+        """
+        misses = [source for source in dict.fromkeys(sources) if self._cached(source) is None]
+        if len(misses) > 1:
+            batches = [misses[i:i + self.max_batch_size] for i in range(0, len(misses), self.max_batch_size)]
+            if len(batches) == 1:
+                self._analyse_batch(batches[0])
+            else:
+                list(self._get_executor().map(self._analyse_batch, batches))
+        # 批量成功的结果已写入缓存；失败批次中的函数在这里逐个请求（每个只请求一次）
+        return self.analyse_functions(sources)
+
+    def _analyse_batch(self, sources: List[str]) -> bool:
+        """用一次请求分析 ``sources`` 并写入缓存；无法拆分结果时返回 False。"""
+        try:
+            response = self._call_llm_api(
+                self._build_batch_analysis_prompt(sources),
+                max_tokens=self.max_tokens * len(sources),
+                schema=BATCH_SCHEMA,
+            )
+            parsed = self._parse_analysis_response(response)
+            results = parsed.get("results") if parsed is not None else None
+        except Exception as e:
+            logger.error("Error in batch analysis: %s", e)
+            return False
+
+        if not isinstance(results, list) or len(results) != len(sources) \
+                or not all(isinstance(result, dict) for result in results):
+            logger.warning("Batch analysis returned mismatched results, falling back to single requests")
+            return False
+
+        for source, result in zip(sources, results):
+            self._store(source, self._with_defaults(result))
+        return True
+
     def comprehensive_analysis(self, source: str, subcalls_results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
         """基于函数代码和子调用结果进行全面分析。
         
@@ -71,178 +367,270 @@ class LLMClient:
         Returns:
             全面的函数分析结果
         """
+        # 源码和子调用结果都未变化时直接复用上次的综合分析
+        cache_key = self._cache_key(
+            f"{source}\0{jsonutil.dumps(dict(sorted(subcalls_results.items())))}", "comprehensive"
+        )
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            logger.info("Using cached comprehensive analysis for function")
+            return cached
+
         # 构建提示数据
         prompt_data = {
             "function_source": source,
             "subcalls_results": subcalls_results
         }
 
-        # 构建系统提示
-        system_prompt = """You are a code analysis assistant. 
-        Based on the function source code and its subcalls' analysis results, provide a comprehensive summary.
-        Focus on how the function orchestrates its subcalls and the overall data flow.
-        
-        Respond in JSON format with the following structure:
-        {
-            "function_calls": ["function1", "function2"], 
-            "global_vars": ["var1", "var2"], 
-            "key_operations": ["description1", "description2"],
-            "summary": "Overall description of what the function does",
-            "data_flow": "Description of how data flows through this function and its subcalls"
-        }
-        """
-
         # 构建用户提示
-        user_prompt = f"Analyze this function and its subcalls:\n```\n{json.dumps(prompt_data, indent=2)}\n```"
+        user_prompt = (
+            f"Analyze this function and its subcalls:\n```\n{compact_prompt_json(prompt_data, 'subcalls_results')}\n```"
+        )
 
         messages = [
-            {"role": "system", "content": system_prompt},
+            self._COMPREHENSIVE_SYSTEM_MSG,
             {"role": "user", "content": user_prompt}
         ]
 
         try:
             # 调用LLM API
-            response = self._call_llm_api(messages)
+            response = self._call_llm_api(messages, max_tokens=self.comprehensive_max_tokens)
 
             # 解析响应
             result = self._parse_analysis_response(response)
+            if result is None:
+                # 返回初步分析结果作为后备（不缓存）
+                return self.analyse_function(source)
+
+            # 缓存结果（出错时的后备结果不缓存）
+            self.cache.set(cache_key, result)
 
             return result
         except Exception as e:
-            logger.error(f"Error in comprehensive analysis: {e}")
+            logger.error("Error in comprehensive analysis: %s", e)
             # 返回初步分析结果作为后备
             return self.analyse_function(source)
 
+    def comprehensive_analyses(
+            self, items: List[Tuple[str, Dict[str, Dict[str, Any]]]]
+    ) -> List[Dict[str, Any]]:
+        """并发地对多个 ``(source, subcalls_results)`` 做综合分析，结果顺序与 ``items`` 一致。"""
+        if len(items) <= 1:
+            return [self.comprehensive_analysis(source, subcalls) for source, subcalls in items]
+        return list(self._get_executor().map(lambda item: self.comprehensive_analysis(*item), items))
+
     def _build_analysis_prompt(self, source: str) -> List[Dict[str, str]]:
         """Build a prompt for the LLM to analyze the function."""
+        return [self._ANALYSIS_SYSTEM_MSG, {"role": "user", "content": f"Analyze this function:\n```\n{source}\n```"}]
+
+    def _build_batch_analysis_prompt(self, sources: List[str]) -> List[Dict[str, str]]:
+        """Build a single prompt asking the LLM to analyze several functions."""
+        functions = "".join(f"### FUNCTION {i}\n```\n{source}\n```\n" for i, source in enumerate(sources))
         return [
-            {
-                "role": "system",
-                "content": """
-            You are a code analysis assistant. 
-            Analyze the provided function and identify:
-            1. Function calls made within the code (exclude logging calls like log.info, print, console.log and language built-in functions like len, str, int, append, etc.)
-            2. Global variables accessed (exclude language constants and built-in variables)
-            3. Key operations performed (focus on business logic, data processing, and algorithmic operations)
-            4. A brief summary of what the function does
-            5. The data flow within the function
-            
-            EXCLUSIONS - Do NOT include:
-            - Logging functions (log.*, print, console.log, fmt.Printf, etc.)
-            - Language built-ins with clear semantics (len, str, int, append, range, etc.)
-            - Standard library functions with obvious purposes (json.loads, os.path.join, etc.)
-            - Error handling keywords (try, catch, throw, panic, etc.)
-            - Control flow keywords (if, for, while, return, break, continue, etc.)
-            
-            FOCUS ON:
-            - Custom/user-defined function calls
-            - External API calls
-            - Database operations
-            - File I/O operations (beyond basic open/close)
-            - Complex data transformations
-            - Business logic functions
-            
-            EXAMPLE JSON OUTPUT:
-            {
-                "function_calls": ["calculateTax", "sendNotification", "validateUser"], 
-                "global_vars": ["CONFIG_TIMEOUT", "DATABASE_URL"], 
-                "key_operations": ["validates user credentials", "calculates tax based on income brackets", "sends email notification"],
-                "summary": "Processes user tax calculation request and sends notification",
-                "data_flow": "Takes user input -> validates credentials -> calculates tax -> stores result -> sends notification"
-            }
-            """
-            },
-            {"role": "user", "content": f"Analyze this function:\n```\n{source}\n```"}
+            self._BATCH_SYSTEM_MSG,
+            {"role": "user", "content": f"Analyze these {len(sources)} functions:\n{functions}"}
         ]
 
-    def _call_llm_api(self, messages: List[Dict[str, str]]) -> str:
+    def _cache_key(self, source: str, kind: str = "exact") -> str:
+        """Return a cache key that is stable across processes."""
+        key = f"{kind}|{self.model}|{self.temperature}|{PROMPT_VERSION}|{source}"
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _cached(self, source: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached analysis, first by exact source, then by normalized source."""
+        exact_key = self._cache_key(source)
+        result = self.cache.get(exact_key)
+        if result is None:
+            # 只有空白或注释不同的函数复用同一份分析
+            result = self.cache.get(self._cache_key(normalize_source(source), "normalized"))
+            if result is not None:
+                self.cache.set(exact_key, result)
+        return result
+
+    def _store(self, source: str, result: Dict[str, Any]) -> None:
+        """Cache ``result`` under both the exact and the normalized source."""
+        self.cache.set(self._cache_key(source), result)
+        self.cache.set(self._cache_key(normalize_source(source), "normalized"), result)
+
+    def _call_llm_api(self, messages: List[Dict[str, str]], max_tokens: int | None = None,
+                      schema: Dict[str, Any] = ANALYSIS_SCHEMA) -> str:
         """Call the LLM API with the given messages."""
         if not self.api_key:
             logger.warning("No API key provided. Using mock response.")
             # 返回一个模拟响应用于测试
             return '{"function_calls": ["example_function"], "global_vars": ["example_var"], "key_operations": ["Example operation"]}'
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-
         data = {
             "model": self.model,
             "messages": messages,
-            "temperature": 0.3,  # 低温度以获得更确定性的响应
-            "max_tokens": self.max_tokens,
-            "response_format": {
-                'type': 'json_object'
-            }
+            "temperature": self.temperature,
+            "max_tokens": max_tokens or self.max_tokens,
+            "response_format": self._response_format(schema),
         }
+        if not self.stream:
+            response = self._session.post(self.endpoint, json=data, timeout=(10, 60))
+            response.raise_for_status()
+            return jsonutil.loads(response.content)["choices"][0]["message"]["content"]
+
+        data["stream"] = True
+        with self._session.post(self.endpoint, json=data, stream=True, timeout=(10, 300)) as response:
+            response.raise_for_status()
+            if not response.headers.get("Content-Type", "").startswith("text/event-stream"):
+                # 服务端不支持流式输出时，按普通响应处理
+                return jsonutil.loads(response.content)["choices"][0]["message"]["content"]
+            return self._read_stream(response)
+
+    def _response_format(self, schema: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the ``response_format`` request field for the configured mode."""
+        if self.response_format == "json_schema":
+            name = "batch_analysis" if schema is BATCH_SCHEMA else "analysis"
+            return {"type": "json_schema", "json_schema": {"name": name, "schema": schema, "strict": True}}
+        return {"type": "json_object"}
 
-        response = requests.post(self.endpoint, headers=headers, json=data)
-        response.raise_for_status()
+    @staticmethod
+    def _read_stream(response: requests.Response) -> str:
+        """Concatenate SSE ``delta.content`` tokens, stopping as soon as the JSON object is complete.
 
-        return response.json()["choices"][0]["message"]["content"]
+        Stopping early leaves the body unread, so the caller's ``with`` block closes the connection;
+        the next request opens a fresh one instead of reusing it from the keep-alive pool.
+        """
+        scanner = _JsonObjectScanner()
+        parts = []
+        for line in response.iter_lines():
+            if not line.startswith(b"data:"):
+                continue
+            payload = line[5:].strip()
+            if payload == b"[DONE]":
+                break
+            choices = jsonutil.loads(payload).get("choices") or ({},)
+            content = (choices[0].get("delta") or {}).get("content") or ""
+            parts.append(content)
+            # 顶层对象已闭合，不再等待剩余的 token（代价是这条连接不能复用）
+            if scanner.feed(content):
+                break
+        return "".join(parts)
+
+    def _parse_analysis_response(self, response: str) -> Optional[Dict[str, Any]]:
+        """Parse the LLM response into a structured format.
 
-    def _parse_analysis_response(self, response: str) -> Dict[str, Any]:
-        """Parse the LLM response into a structured format."""
+        Returns None when no JSON object can be recovered, so callers can avoid caching the failure.
+        """
         try:
             # 尝试解析JSON响应
-            result = json.loads(response)
+            result = jsonutil.loads(response)
+        except ValueError:
+            # 响应中夹杂了其他文字时，依次尝试其中括号配对的 {...} 片段，取第一个能解析的
+            result = None
+            for candidate in _iter_json_objects(response):
+                try:
+                    result = jsonutil.loads(candidate)
+                    break
+                except ValueError:
+                    continue
 
+        if isinstance(result, dict):
             # 确保所有必要的键都存在
-            result.setdefault("function_calls", [])
-            result.setdefault("global_vars", [])
-            result.setdefault("key_operations", [])
-            result.setdefault("summary", "")
-            result.setdefault("data_flow", "")
+            return self._with_defaults(result)
 
-            return result
-        except json.JSONDecodeError:
-            logger.error(f"Failed to parse LLM response as JSON: {response}")
-            # 尝试从文本中提取信息（简单的后备方案）
-            function_calls = []
-            global_vars = []
-            key_operations = []
-            summary = ""
-            data_flow = ""
-
-            # 简单的文本解析逻辑
-            lines = response.split("\n")
-            current_section = None
-
-            for line in lines:
-                line = line.strip()
-                if "function call" in line.lower():
-                    current_section = "function_calls"
-                elif "global variable" in line.lower():
-                    current_section = "global_vars"
-                elif "key operation" in line.lower():
-                    current_section = "key_operations"
-                elif "summary" in line.lower():
-                    current_section = "summary"
-                    summary = ""
-                elif "data flow" in line.lower():
-                    current_section = "data_flow"
-                    data_flow = ""
-                elif line and current_section:
-                    # 提取项目（假设格式为"- item"或"* item"）
-                    if current_section in ["function_calls", "global_vars", "key_operations"] and (
-                            line.startswith("-") or line.startswith("*")):
-                        item = line[1:].strip()
-                        if current_section == "function_calls":
-                            function_calls.append(item)
-                        elif current_section == "global_vars":
-                            global_vars.append(item)
-                        elif current_section == "key_operations":
-                            key_operations.append(item)
-                elif current_section == "summary":
-                    summary += line + " "
-                elif current_section == "data_flow":
-                    data_flow += line + " "
-
-            return {
-                "function_calls": function_calls,
-                "global_vars": global_vars,
-                "key_operations": key_operations,
-                "summary": summary.strip(),
-                "data_flow": data_flow.strip()
-            }
+        logger.error("Failed to parse LLM response as JSON: %s", response)
+        return None
+
+    def _fallback_analysis(self, response: str) -> Dict[str, Any]:
+        """Best-effort analysis for a response that is not valid JSON; never cached."""
+        # 基于关键词的文本解析默认关闭，需要时通过环境变量开启
+        if os.environ.get("CALLGRAPHITE_PARSE_FALLBACK"):
+            return self._parse_text_sections(response)
+        return self._with_defaults({})
+
+    @staticmethod
+    def _parse_text_sections(response: str) -> Dict[str, Any]:
+        """Extract analysis fields from a free-form text response."""
+        # 尝试从文本中提取信息（简单的后备方案）
+        function_calls = []
+        global_vars = []
+        key_operations = []
+        summary = ""
+        data_flow = ""
+
+        # 简单的文本解析逻辑
+        lines = response.split("\n")
+        current_section = None
+
+        for line in lines:
+            line = line.strip()
+            if "function call" in line.lower():
+                current_section = "function_calls"
+            elif "global variable" in line.lower():
+                current_section = "global_vars"
+            elif "key operation" in line.lower():
+                current_section = "key_operations"
+            elif "summary" in line.lower():
+                current_section = "summary"
+                summary = ""
+            elif "data flow" in line.lower():
+                current_section = "data_flow"
+                data_flow = ""
+            elif line and current_section:
+                # 提取项目（假设格式为"- item"或"* item"）
+                if current_section in ["function_calls", "global_vars", "key_operations"] and (
+                        line.startswith("-") or line.startswith("*")):
+                    item = line[1:].strip()
+                    if current_section == "function_calls":
+                        function_calls.append(item)
+                    elif current_section == "global_vars":
+                        global_vars.append(item)
+                    elif current_section == "key_operations":
+                        key_operations.append(item)
+            elif current_section == "summary":
+                summary += line + " "
+            elif current_section == "data_flow":
+                data_flow += line + " "
+
+        return {
+            "function_calls": function_calls,
+            "global_vars": global_vars,
+            "key_operations": key_operations,
+            "summary": summary.strip(),
+            "data_flow": data_flow.strip()
+        }
+
+    @staticmethod
+    def _with_defaults(result: Dict[str, Any]) -> Dict[str, Any]:
+        """Ensure an analysis result contains every expected key."""
+        result.setdefault("function_calls", [])
+        result.setdefault("global_vars", [])
+        result.setdefault("key_operations", [])
+        result.setdefault("summary", "")
+        result.setdefault("data_flow", "")
+        return result
+
+
+# 整个 Neovim 会话共享的客户端，多次 :CallGraphite 之间复用缓存和 HTTP 连接池
+_DEFAULT: Optional[LLMClient] = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def _client_config(config: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+    """Return the parts of ``config`` that LLMClient reads when it is constructed."""
+    return config.get("llm", {}), bool(config.get("analysis", {}).get("cache_results", True))
+
+
+def get_default_client() -> LLMClient:
+    """Return the process-wide LLMClient, rebuilding it when the loaded config has changed."""
+    global _DEFAULT
+    with _DEFAULT_LOCK:
+        if _DEFAULT is not None and _DEFAULT.config_snapshot != _client_config(load_config()):
+            # 修改 api_key/model/endpoint 等配置后无需重启 Neovim
+            logger.info("LLM config changed, recreating client")
+            _DEFAULT.close()
+            _DEFAULT = None
+        if _DEFAULT is None:
+            _DEFAULT = LLMClient()
+        return _DEFAULT
+
+
+@atexit.register
+def _close_default_client() -> None:
+    with _DEFAULT_LOCK:
+        if _DEFAULT is not None:
+            _DEFAULT.close()
@@ -1,16 +1,18 @@
 # ~/.config/nvim/pythonx/callgraphite.py
 import logging
 import os
+from logging.handlers import RotatingFileHandler
 
 # 设置日志文件路径
 LOG_PATH = os.path.expanduser("~/.local/share/nvim/callgraphite.log")
 os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
 
-# 初始化日志
-logging.basicConfig(
-    level=logging.DEBUG,
-    filename=LOG_PATH,
-    filemode="a",
-    format="%(asctime)s [%(levelname)s] %(message)s",
-)
 logger = logging.getLogger("CallGraphite")
+
+# 初始化日志：按大小滚动（10 MB × 3），避免日志文件无限增长
+# 插件被重新加载时模块会再次执行，已有 handler 就不再重复挂载，避免每行日志写两次
+if not logger.handlers:
+    _handler = RotatingFileHandler(LOG_PATH, maxBytes=10 * 1024 * 1024, backupCount=3, encoding="utf-8")
+    _handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.DEBUG)
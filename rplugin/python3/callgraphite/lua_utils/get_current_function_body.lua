@@ -38,6 +38,7 @@ end
 -- 🔧 打印整个函数节点结构
 print_node_tree(node)
 
--- ✅ 返回函数范围（不变）
+-- ✅ 返回函数范围，并一并返回按范围截取好的文本行，省去 Python 端再取一次缓冲区内容和切片
 local start_row, start_col, end_row, end_col = node:range()
-return { start_row, start_col, end_row, end_col }
+local lines = vim.api.nvim_buf_get_text(0, start_row, start_col, end_row, end_col, {})
+return { start_row, start_col, end_row, end_col, lines }
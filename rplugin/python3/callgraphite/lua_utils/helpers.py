@@ -1,19 +1,14 @@
 # ~/.config/nvim/pythonx/callgraphite.py
-import logging
+import bisect
 import os
+import re
 
-# 设置日志文件路径
-LOG_PATH = os.path.expanduser("~/.local/share/nvim/callgraphite.log")
-os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
+from pynvim import NvimError
 
-# 初始化日志
-logging.basicConfig(
-    level=logging.DEBUG,
-    filename=LOG_PATH,
-    filemode="a",
-    format="%(asctime)s [%(levelname)s] %(message)s",
-)
-logger = logging.getLogger("CallGraphite")
+from ..log import logger
+
+# 已读取的 Lua 脚本内容，按文件名缓存
+_LUA_CACHE: dict[str, str] = {}
 
 
 def load_lua_and_exec(nvim, filename: str, args: list = None):
@@ -24,12 +19,11 @@ def load_lua_and_exec(nvim, filename: str, args: list = None):
     :param filename: Lua file name (e.g., 'graphite_request.lua')
     :param args: Optional list of arguments passed to exec_lua()
     """
-    base_dir = os.path.dirname(__file__)
-    full_path = os.path.join(base_dir, filename)
-
     try:
-        with open(full_path, 'r') as f:
-            lua_code = f.read()
+        lua_code = _LUA_CACHE.get(filename)
+        if lua_code is None:
+            with open(os.path.join(os.path.dirname(__file__), filename), 'r') as f:
+                lua_code = _LUA_CACHE[filename] = f.read()
         return nvim.exec_lua(lua_code, args or [])
     except Exception as e:
         nvim.err_write(f"[CallGraphite] Failed to load Lua file: {filename}\n")
@@ -37,18 +31,37 @@ def load_lua_and_exec(nvim, filename: str, args: list = None):
         return None
 
 
-def run_get_buf_references(nvim, task_id: int, position=None):
+def call_atomic(nvim, calls: list) -> list:
     """
-    Execute the Lua script to get buffer references.
-    
-    This function executes 'get_buf_references.lua' to retrieve reference information
-    from the current buffer, typically used for analyzing function call relationships
-    and reference dependencies.
-    
+    Send several API calls to Neovim in a single ``nvim_call_atomic`` request.
+
+    :param nvim: pynvim.Nvim instance
+    :param calls: List of ``[method_name, args]`` pairs, executed in order
+    :return: List with the results of the calls
+    :raises NvimError: If one of the calls fails; the calls after it are not executed
+    """
+    results, error = nvim.api.call_atomic(calls)
+    if error is not None:
+        # error = [index, type, message]，出错之后的调用不会被执行，与 nvim.command 一样抛出异常
+        index, _, message = error
+        logger.error("call_atomic failed at %s (%s): %s", index, calls[index][0], message)
+        raise NvimError(f"call_atomic failed at {index} ({calls[index][0]}): {message}")
+    return results
+
+
+def run_get_buf_references(nvim, position=None) -> list:
+    """
+    Get the references of the symbol under the cursor.
+
+    Calls ``get_buf_references`` from lua/callgraphite.lua, which waits for the
+    LSP ``textDocument/references`` response inside Neovim, so the locations
+    come back in the same RPC.
+
     :param nvim: pynvim.Nvim instance for interacting with Neovim
-    :param task_id: Task identifier for tracking and managing asynchronous tasks
+    :param position: Optional LSP position (0-based); defaults to the cursor
+    :return: List of LSP Location dicts
     """
-    load_lua_and_exec(nvim, 'get_buf_references.lua', args=[{'id': task_id, 'position': position}])
+    return nvim.exec_lua("return require('callgraphite').get_buf_references(...)", position) or []
 
 
 class FunctionBody:
@@ -58,49 +71,39 @@ class FunctionBody:
         self.end_row = er
         self.end_col = ec
         self.lines = lines  # list of strings (already trimmed by col range)
+        # 整个函数体拼成一个字符串，并记录每行起始偏移，便于把偏移量换算成行列
+        self._buf = "\n".join(lines)
+        self._line_starts = [0]
+        offset = 0
+        for line in lines[:-1]:
+            offset += len(line) + 1
+            self._line_starts.append(offset)
 
     def get_content(self):
-        return "\n".join(self.lines)
+        return self._buf
+
+    def _row_col(self, offset):
+        """Map an offset in the joined body to (absolute_row, absolute_col)."""
+        i = bisect.bisect_right(self._line_starts, offset) - 1
+        col = offset - self._line_starts[i]
+        return (self.start_row + i, col if i > 0 else self.start_col + col)
 
     def search(self, query):
         """
         Search for the first occurrence of query.
         :return: (absolute_row, absolute_col) if found, else None
         """
-        for i, line in enumerate(self.lines):
-            col = line.find(query)
-            if col != -1:
-                absolute_row = self.start_row + i
-                absolute_col = col if i > 0 else self.start_col + col
-                return (absolute_row, absolute_col)
-        return None
+        offset = self._buf.find(query)
+        return None if offset < 0 else self._row_col(offset)
 
     def search_all(self, query):
-        results = []
-        for i, line in enumerate(self.lines):
-            offset = 0
-            while True:
-                col = line.find(query, offset)
-                if col == -1:
-                    break
-                absolute_row = self.start_row + i
-                absolute_col = col if i > 0 else self.start_col + col
-                results.append((absolute_row, absolute_col))
-                offset = col + 1
-        return results
-
-
-def run_get_current_function_body_new(nvim):
-    pos = load_lua_and_exec(nvim, 'get_current_function_body.lua', args=[])
-    if not pos:
-        return None
-
-    sr, sc, er, ec = pos
-    lines = nvim.current.buffer[sr:er + 1]
-    lines[0] = lines[0][sc:] if sr == er else lines[0][sc:]
-    lines[-1] = lines[-1][:ec] if sr != er else lines[-1]
-
-    return FunctionBody(sr, sc, er, ec, lines)
+        """
+        Search for every occurrence of query, including overlapping ones.
+        :return: list of (absolute_row, absolute_col)
+        """
+        # 零宽前瞻匹配，与逐字符推进的 str.find 一样能找到重叠的出现位置
+        pattern = re.compile(f"(?={re.escape(query)})")
+        return [self._row_col(match.start()) for match in pattern.finditer(self._buf)]
 
 
 def run_get_current_function_body(nvim):
@@ -113,20 +116,17 @@ def run_get_current_function_body(nvim):
     multi-line functions.
     
     :param nvim: pynvim.Nvim instance for interacting with Neovim
-    :return: str - The extracted function body as a string, or None if no function is found
+    :return: FunctionBody - The extracted function body, or None if no function is found
     
     The function works by:
     1. Getting position coordinates (start_row, start_col, end_row, end_col) from Lua
-    2. Extracting the relevant lines from the buffer
-    3. Properly handling the first and last lines to get exact function boundaries
+    2. Taking the function text, which the Lua script already trims to the exact
+       range with nvim_buf_get_text in the same call
     """
     pos = load_lua_and_exec(nvim, 'get_current_function_body.lua', args=[])
     if not pos:
         logger.debug("no pos")
         return None
 
-    sr, sc, er, ec = pos
-    lines = nvim.current.buffer[sr:er + 1]
-    lines[0] = lines[0][sc:] if sr == er else lines[0][sc:]
-    lines[-1] = lines[-1][:ec] if sr != er else lines[-1]
-    return "\n".join(lines)
+    sr, sc, er, ec, lines = pos
+    return FunctionBody(sr, sc, er, ec, lines)
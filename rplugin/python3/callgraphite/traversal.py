@@ -1,36 +1,45 @@
 """Call graph traversal logic using LSP and LLM analysis."""
 from __future__ import annotations
 
-from typing import Iterable, List, Set, Tuple, Dict, Any
+import functools
+import re
+from collections import deque
+from typing import Callable, Deque, Iterable, List, Optional, Set, Tuple, Dict, Any
 from pynvim import Nvim
 
 from .capture import get_current_function_text
-from .llm import LLMClient
+from .graph_ops import recursive_symbols, scc_components
+from .llm import LLMClient, compact_prompt_json, get_default_client
 from .log import logger
-
-# 添加用于生成图表的库
-import json
+from .lua_utils.helpers import call_atomic, run_get_buf_references
+from .uri import uri_to_path
 
 
 class JumpStack:
     """Maintain jump history for forward/backward navigation."""
 
+    # 最多保留的跳转记录数，超出时丢弃最早的记录
+    _MAX = 1024
+
     def __init__(self, nvim: Nvim) -> None:
         self.nvim = nvim
-        self.stack: List[Tuple[str, int, int]] = []
+        self.stack: Deque[Tuple[str, int, int]] = deque(maxlen=self._MAX)
         self.index: int = -1
 
     def _jump(self, path: str, line: int, col: int) -> None:
-        """Perform a jump within Neovim."""
-        self.nvim.command(f"keepjumps edit {path}")
-        self.nvim.call("cursor", line, col)
+        """Perform a jump within Neovim (a single RPC)."""
+        call_atomic(self.nvim, [
+            ["nvim_cmd", [{"cmd": "edit", "args": [path], "mods": {"keepjumps": True}}, {}]],
+            ["nvim_win_set_cursor", [0, [line, col - 1]]],
+        ])
 
     def push(self, path: str, line: int, col: int) -> None:
         """Jump to ``path`` and record the location."""
-        if self.index < len(self.stack) - 1:
-            self.stack = self.stack[: self.index + 1]
+        # 丢弃当前位置之后的前进记录（原地删除，不复制列表）
+        while len(self.stack) > self.index + 1:
+            self.stack.pop()
         self.stack.append((path, line, col))
-        self.index += 1
+        self.index = len(self.stack) - 1
         self._jump(path, line, col)
 
     def back(self) -> None:
@@ -50,22 +59,71 @@ class JumpStack:
         self._jump(path, line, col)
 
 
+# 缺少分析结果时使用的共享空字典（只读），避免每次查找都新建字典
+_EMPTY: Dict[str, Any] = {}
+
+# 源码缓存中“尚未查询”的标记，与“该位置没有函数”（None）区分
+_MISSING = object()
+
+
+def _build_matcher(names: Iterable[str]) -> Callable[[str], Any]:
+    """Return a predicate telling whether a lowercased name contains any of ``names`` (case-insensitive)."""
+    # 统一转成小写后编译成一个正则，每个调用只需扫描一次
+    important = {name.lower() for name in names}
+    if not important:
+        return lambda name: False
+    return re.compile("|".join(map(re.escape, sorted(important)))).search
+
+
+def _call_priority(matcher: Callable[[str], Any], call: Tuple[str, int, int]) -> int:
+    """Sort key for ``_prioritize_calls``: 0 for calls the LLM flagged as important, else 1."""
+    # 从URI中提取函数名（简化处理，实际可能需要更复杂的逻辑）
+    func_name = call[0].rsplit("/", 1)[-1].split(".", 1)[0].lower()
+    return 0 if matcher(func_name) else 1
+
+
+def _bullets(items: Iterable[str]) -> str:
+    """Render ``items`` as markdown bullet lines, each preceded by a newline."""
+    return "".join(f"\n- {item}" for item in items)
+
+
 class TraversalManager:
     """Coordinate a DFS traversal of function calls."""
 
-    def __init__(self, nvim: Nvim, plugin) -> None:
-        """Initialize with the current Neovim instance."""
+    def __init__(self, nvim: Nvim, plugin, llm: LLMClient | None = None) -> None:
+        """Initialize with the current Neovim instance.
+
+        ``llm`` defaults to the client shared by the whole session.
+        """
         self.nvim = nvim
         self.plugin = plugin
         self.jumps = JumpStack(nvim)
         self.visited: Set[str] = set()
-        self.llm = LLMClient()
+        self.llm = llm or get_default_client()
         # 添加调用关系图数据结构
         self.call_graph = {}
-        # 添加函数分析结果缓存
-        self.analysis_cache = {}
+        # call_graph 的扁平视图：symbol -> 子调用列表 / 分析结果，供可视化直接查找
+        self._adj: Dict[str, List[str]] = {}
+        self._analysis: Dict[str, Dict[str, Any]] = {}
         # 添加子调用结果缓存
         self.subcalls_results = {}
+        # 可视化用的节点 ID 和简化名称，按符号缓存；ID 递增分配，保证不冲突
+        self._node_ids: Dict[str, str] = {}
+        self._short_names: Dict[str, str] = {}
+
+    def _node_id(self, symbol: str) -> str:
+        """Return the Mermaid node id of ``symbol``."""
+        node_id = self._node_ids.get(symbol)
+        if node_id is None:
+            node_id = self._node_ids[symbol] = f"node_{len(self._node_ids)}"
+        return node_id
+
+    def _short_name(self, symbol: str) -> str:
+        """Return the display name of ``symbol`` (file name without path and position)."""
+        short_name = self._short_names.get(symbol)
+        if short_name is None:
+            short_name = self._short_names[symbol] = symbol.rsplit("/", 1)[-1].split(":", 1)[0]
+        return short_name
 
     def _cursor_location(self) -> Tuple[str, int, int]:
         """Return the current buffer path, line and column."""
@@ -84,49 +142,114 @@ class TraversalManager:
         self.visit_function("<root>", source)
 
     def visit_function(self, symbol: str, source: str) -> Dict[str, Any]:
-        """分析函数并递归访问其调用的函数。"""
+        """分析函数并遍历其调用的函数。
+
+        使用显式的工作队列代替递归：第一阶段逐层展开调用图，每层未缓存的函数合并为一次
+        批量 LLM 请求；第二阶段按强连通分量的逆拓扑序做综合分析，保证被调函数的结果先于
+        调用方完成（只有互相递归的函数之间拿不到彼此的结果）。
+        """
         if symbol in self.visited:
             return self.subcalls_results.get(symbol, {})
         self.visited.add(symbol)
 
-        # 第一阶段：初步分析函数
-        initial_analysis = self.llm.analyse_function(source)
-
-        # 获取函数调用位置
-        called_functions = self._called_functions(symbol)
-
-        # 过滤调用，优先处理LLM识别的重要函数调用
-        prioritized_calls = self._prioritize_calls(called_functions, initial_analysis)
-
-        # 子调用的分析结果
-        subcalls_analysis = {}
-
-        # 遍历调用
-        for uri, line, col in prioritized_calls:
+        # symbol -> (跳转位置, 源码)；起始函数就在当前光标处，不需要跳转
+        nodes: Dict[str, Tuple[Tuple[str, int, int] | None, str]] = {symbol: (None, source)}
+        initial_analyses: Dict[str, Dict[str, Any]] = {}
+        children: Dict[str, List[str]] = {}
+        # 本次遍历中各调用位置对应的函数源码，同一个被调函数只跳转和提取一次；
+        # 只在第一阶段使用，随本函数返回一起释放
+        source_cache: Dict[Tuple[str, int, int], Optional[str]] = {}
+
+        # 第一阶段：逐层初步分析并查找函数调用
+        frontier = [symbol]
+        while frontier:
+            analyses = self.llm.analyse_functions_batch([nodes[sym][1] for sym in frontier])
+            next_frontier = []
+            for sym, initial_analysis in zip(frontier, analyses):
+                initial_analyses[sym] = initial_analysis
+                location = nodes[sym][0]
+                if location is not None:
+                    self.jumps.push(*location)
+
+                # 过滤调用，优先处理LLM识别的重要函数调用
+                prioritized_calls = self._prioritize_calls(self._called_functions(sym), initial_analysis)
+
+                child_symbols = []
+                for uri, line, col in prioritized_calls:
+                    child_source = self._function_text_at(uri, line, col, source_cache)
+                    if not child_source:
+                        continue
+                    child_symbol = f"{uri}:{line}:{col}"
+                    child_symbols.append(child_symbol)
+                    if child_symbol not in self.visited:
+                        self.visited.add(child_symbol)
+                        nodes[child_symbol] = ((uri, line, col), child_source)
+                        next_frontier.append(child_symbol)
+                children[sym] = child_symbols
+
+                if location is not None:
+                    self.jumps.back()
+            frontier = next_frontier
+
+        # 第二阶段：在本次发现的调用图上按强连通分量后序完成综合分析；
+        # 被调分量全部完成的函数为一轮，同一轮中的函数并发请求
+        component = scc_components({sym: {"calls": calls} for sym, calls in children.items()})
+        pending = list(nodes)
+        while pending:
+            waiting = {component[sym] for sym in pending}
+            # 还有被调函数（属于其他分量）未完成的分量留到下一轮；分量图无环，每轮至少有一个分量就绪
+            blocked = {
+                component[sym] for sym in pending
+                if any(component[c] != component[sym] and component[c] in waiting for c in children[sym])
+            }
+            ready = [sym for sym in pending if component[sym] not in blocked]
+            pending = [sym for sym in pending if component[sym] in blocked]
+
+            # 子调用的分析结果（同一递归分量内尚未完成的节点会被跳过）
+            subcalls = {
+                sym: {
+                    child: self.subcalls_results[child]
+                    for child in children[sym] if self.subcalls_results.get(child)
+                }
+                for sym in ready
+            }
+            # 如果没有子调用，直接使用初步分析结果
+            needs_llm = [sym for sym in ready if subcalls[sym]]
+            comprehensive = dict(zip(needs_llm, self.llm.comprehensive_analyses(
+                [(nodes[sym][1], subcalls[sym]) for sym in needs_llm]
+            )))
+
+            for sym in ready:
+                # 该节点的源码和初步分析之后不再需要，及早释放（源码可能很大）
+                del nodes[sym]
+                initial_analysis = initial_analyses.pop(sym)
+                comprehensive_analysis = comprehensive.get(sym) or initial_analysis
+
+                # 显示分析结果给用户（在主线程中进行 RPC）
+                self._display_analysis(sym, comprehensive_analysis, subcalls[sym])
+
+                # 缓存分析结果并记录调用关系，供可视化使用
+                self.subcalls_results[sym] = comprehensive_analysis
+                self._record_node(sym, children[sym], comprehensive_analysis)
+
+        return self.subcalls_results[symbol]
+
+    def _function_text_at(self, uri: str, line: int, col: int,
+                          cache: Dict[Tuple[str, int, int], Optional[str]]) -> Optional[str]:
+        """Return the text of the function at a location, jumping there only if it is not in ``cache``."""
+        key = (uri, line, col)
+        source = cache.get(key, _MISSING)
+        if source is _MISSING:
             self.jumps.push(uri, line, col)
-            child_source = get_current_function_text(self.nvim)
-            if child_source:
-                child_symbol = f"{uri}:{line}:{col}"
-                # 递归访问子函数，并获取其分析结果
-                child_analysis = self.visit_function(child_symbol, child_source)
-                if child_analysis:
-                    subcalls_analysis[child_symbol] = child_analysis
+            source = cache[key] = get_current_function_text(self.nvim)
             self.jumps.back()
+        return source
 
-        # 第二阶段：基于子调用结果进行全面分析
-        if subcalls_analysis:
-            comprehensive_analysis = self.llm.comprehensive_analysis(source, subcalls_analysis)
-        else:
-            # 如果没有子调用，直接使用初步分析结果
-            comprehensive_analysis = initial_analysis
-
-        # 显示分析结果给用户
-        self._display_analysis(symbol, comprehensive_analysis, subcalls_analysis)
-
-        # 缓存分析结果
-        self.subcalls_results[symbol] = comprehensive_analysis
-
-        return comprehensive_analysis
+    def _record_node(self, symbol: str, calls: List[str], analysis: Dict[str, Any]) -> None:
+        """Record ``symbol`` in the call graph and its flattened adjacency/analysis views."""
+        self.call_graph[symbol] = {"calls": calls, "analysis": analysis}
+        self._adj[symbol] = calls
+        self._analysis[symbol] = analysis
 
     def _comprehensive_analysis(self, symbol: str, current_analysis: dict, subcalls_analysis: dict) -> dict:
         """基于当前函数分析和子调用结果进行更全面的分析。"""
@@ -161,7 +284,7 @@ class TraversalManager:
             }
             """},
             {"role": "user",
-             "content": f"Analyze this function and its subcalls:\n```\n{json.dumps(prompt_data, indent=2)}\n```"}
+             "content": f"Analyze this function and its subcalls:\n```\n{compact_prompt_json(prompt_data, 'subcalls')}\n```"}
         ]
 
         try:
@@ -170,6 +293,8 @@ class TraversalManager:
 
             # 解析响应
             result = self.llm._parse_analysis_response(response)
+            if result is None:
+                return current_analysis
 
             # 确保包含原始分析的所有字段
             for key, value in current_analysis.items():
@@ -178,271 +303,167 @@ class TraversalManager:
 
             return result
         except Exception as e:
-            logger.error(f"Error in comprehensive analysis: {e}")
+            logger.error("Error in comprehensive analysis: %s", e)
             return current_analysis
 
     def _display_analysis(self, symbol: str, analysis: dict, subcalls_analysis: dict = None) -> None:
         """显示函数分析结果。"""
-        # 创建一个新的缓冲区来显示分析结果
-        self.nvim.command("botright new CallGraphite-Analysis")
-        self.nvim.command("setlocal buftype=nofile bufhidden=wipe noswapfile nowrap")
-
-        # 准备显示内容
-        lines = [f"# Analysis of {symbol}", ""]
+        # 准备显示内容：逐段拼成字符串，最后一次性拆分成行
+        blocks = [f"# Analysis of {symbol}\n"]
 
         # 添加综合摘要（如果有）
         if "summary" in analysis:
-            lines.append("## Summary")
-            lines.append(analysis["summary"])
-            lines.append("")
+            blocks.append(f"## Summary\n{analysis['summary']}\n")
 
         # 添加数据流（如果有）
         if "data_flow" in analysis:
-            lines.append("## Data Flow")
-            lines.append(analysis["data_flow"])
-            lines.append("")
-
-        # 添加函数调用
-        lines.append("## Function Calls")
-        for func in analysis.get("function_calls", []):
-            lines.append(f"- {func}")
-        lines.append("")
+            blocks.append(f"## Data Flow\n{analysis['data_flow']}\n")
 
-        # 添加全局变量
-        lines.append("## Global Variables")
-        for var in analysis.get("global_vars", []):
-            lines.append(f"- {var}")
-        lines.append("")
-
-        # 添加关键操作
-        lines.append("## Key Operations")
-        for op in analysis.get("key_operations", []):
-            lines.append(f"- {op}")
+        # 添加函数调用、全局变量和关键操作
+        blocks.append(f"## Function Calls{_bullets(analysis.get('function_calls', []))}\n")
+        blocks.append(f"## Global Variables{_bullets(analysis.get('global_vars', []))}\n")
+        blocks.append(f"## Key Operations{_bullets(analysis.get('key_operations', []))}")
 
         # 如果有子调用分析，添加子调用摘要
-        if subcalls_analysis and subcalls_analysis:
-            lines.append("")
-            lines.append("## Subcalls Summary")
+        if subcalls_analysis:
+            blocks.append("\n## Subcalls Summary")
             for child_symbol, child_analysis in subcalls_analysis.items():
-                lines.append(f"### {child_symbol}")
                 if "summary" in child_analysis:
-                    lines.append(child_analysis["summary"])
+                    blocks.append(f"### {child_symbol}\n{child_analysis['summary']}\n")
                 else:
-                    # 如果没有摘要，显示关键操作
-                    for op in child_analysis.get("key_operations", [])[:2]:  # 只显示前两个操作
-                        lines.append(f"- {op}")
-                lines.append("")
+                    # 如果没有摘要，显示关键操作（只显示前两个操作）
+                    blocks.append(f"### {child_symbol}{_bullets(child_analysis.get('key_operations', [])[:2])}\n")
 
-        # 设置缓冲区内容
-        self.nvim.current.buffer[:] = lines
+        # 摘要等字段本身可能包含换行，按行拆分后再写入缓冲区
+        lines = "\n".join(blocks).split("\n")
 
-        # 设置为markdown语法高亮
-        self.nvim.command("setlocal filetype=markdown")
-
-        # 返回到原始缓冲区
-        self.nvim.command("wincmd p")
+        # 创建一个新的缓冲区来显示分析结果
+        self._show_panel("botright new CallGraphite-Analysis", lines)
 
     def _generate_visualizations(self, root_symbol: str) -> None:
         """生成并显示调用图和流程图。"""
-        # 创建一个新的缓冲区来显示可视化
-        self.nvim.command("botright vnew CallGraphite-Visualizations")
-        self.nvim.command("setlocal buftype=nofile bufhidden=wipe noswapfile nowrap")
+        # 一次遍历同时生成三种图
+        ascii_lines: List[str] = []
+        graph_lines: List[str] = []
+        flow_lines: List[str] = []
+        self._walk(root_symbol, "", set(), set(), ascii_lines, graph_lines, flow_lines)
+
+        # 用强连通分量标出参与递归（含互相调用）的函数
+        recursive = [self._node_id(sym) for sym in recursive_symbols(self.call_graph) if sym in self._node_ids]
+        if recursive:
+            graph_lines.append("    classDef recursive stroke-dasharray: 5 5")
+            graph_lines.append(f"    class {','.join(sorted(recursive))} recursive")
 
         # 准备显示内容
         lines = [f"# Visualizations for {root_symbol}", ""]
 
-        # 生成ASCII调用图
+        # ASCII调用图
         lines.append("## Call Graph (ASCII)")
         lines.append("```")
-        lines.extend(self._generate_ascii_call_graph(root_symbol))
+        lines.extend(ascii_lines)
         lines.append("```")
         lines.append("")
 
-        # 生成Mermaid调用图
+        # Mermaid调用图
         lines.append("## Call Graph (Mermaid)")
         lines.append("```mermaid")
         lines.append("graph TD")
-        lines.extend(self._generate_mermaid_call_graph(root_symbol))
+        lines.extend(graph_lines)
         lines.append("```")
         lines.append("")
 
-        # 生成Mermaid流程图
+        # Mermaid流程图
         lines.append("## Flow Chart (Mermaid)")
         lines.append("```mermaid")
         lines.append("flowchart TD")
-        lines.extend(self._generate_mermaid_flow_chart(root_symbol))
+        lines.extend(flow_lines)
         lines.append("```")
 
-        # 设置缓冲区内容
-        self.nvim.current.buffer[:] = lines
-
-        # 设置为markdown语法高亮
-        self.nvim.command("setlocal filetype=markdown")
-
-        # 返回到原始缓冲区
-        self.nvim.command("wincmd p")
-
-    def _generate_ascii_call_graph(self, root_symbol: str, indent: str = "", visited: Set[str] = None) -> List[str]:
-        """生成ASCII格式的调用图。"""
-        if visited is None:
-            visited = set()
-
-        if root_symbol in visited:
-            return [f"{indent}└── {root_symbol} (recursive)"]
-
-        visited.add(root_symbol)
-
-        lines = [f"{indent}└── {root_symbol}"]
-
-        # 获取子调用
-        calls = self.call_graph.get(root_symbol, {}).get("calls", [])
-
-        for i, call in enumerate(calls):
-            is_last = i == len(calls) - 1
-            new_indent = indent + "    "
-
-            # 递归生成子调用的图
-            child_lines = self._generate_ascii_call_graph(call, new_indent, visited.copy())
-            lines.extend(child_lines)
-
-        return lines
-
-    def _generate_mermaid_call_graph(self, root_symbol: str, visited: Set[str] = None) -> List[str]:
-        """生成Mermaid格式的调用图。"""
-        if visited is None:
-            visited = set()
-
-        if root_symbol in visited:
-            return []  # 避免循环引用
-
-        visited.add(root_symbol)
-
-        lines = []
-
-        # 为节点创建唯一ID
-        node_id = f"node_{hash(root_symbol) % 10000}"
-
-        # 添加节点定义
-        short_name = root_symbol.split("/")[-1].split(":")[0]  # 简化显示名称
-        lines.append(f"    {node_id}[\"{short_name}\"]")
-
-        # 获取子调用
-        calls = self.call_graph.get(root_symbol, {}).get("calls", [])
-
-        for call in calls:
-            # 为子节点创建唯一ID
-            child_id = f"node_{hash(call) % 10000}"
-
-            # 添加边
-            lines.append(f"    {node_id} --> {child_id}")
-
-            # 递归生成子调用的图
-            child_lines = self._generate_mermaid_call_graph(call, visited.copy())
-            lines.extend(child_lines)
-
-        return lines
-
-    def _generate_mermaid_flow_chart(self, root_symbol: str, visited: Set[str] = None) -> List[str]:
-        """生成Mermaid格式的流程图。"""
-        if visited is None:
-            visited = set()
-
-        if root_symbol in visited:
-            return []  # 避免循环引用
-
-        visited.add(root_symbol)
-
-        lines = []
+        # 创建一个新的缓冲区来显示可视化
+        self._show_panel("botright vnew CallGraphite-Visualizations", lines)
+
+    def _show_panel(self, open_cmd: str, lines: List[str]) -> None:
+        """Open a scratch markdown window with ``lines`` and return to the previous window in one RPC."""
+        call_atomic(self.nvim, [
+            ["nvim_command", [open_cmd]],
+            ["nvim_command", ["setlocal buftype=nofile bufhidden=wipe noswapfile nowrap"]],
+            # 新窗口此时是当前窗口，0 即新建的缓冲区
+            ["nvim_buf_set_lines", [0, 0, -1, False, lines]],
+            # 设置为markdown语法高亮
+            ["nvim_command", ["setlocal filetype=markdown"]],
+            # 返回到原始缓冲区
+            ["nvim_command", ["wincmd p"]],
+        ])
+
+    def _walk(self, symbol: str, indent: str, visited: Set[str], on_path: Set[str],
+              ascii_lines: List[str], graph_lines: List[str], flow_lines: List[str]) -> None:
+        """遍历一次调用图，同时生成ASCII调用图、Mermaid调用图和Mermaid流程图。
+
+        ``visited`` 记录已经展开过的节点，所有分支共享；``on_path`` 只包含当前路径上的节点，
+        用于区分递归调用和在别处已展开的节点。已展开的节点在Mermaid图中只定义一次。
+        """
+        if symbol in on_path:
+            ascii_lines.append(f"{indent}└── {symbol} (recursive)")
+            return
+        if symbol in visited:
+            ascii_lines.append(f"{indent}└── {symbol} (see above)")
+            return
 
-        # 为节点创建唯一ID
-        node_id = f"node_{hash(root_symbol) % 10000}"
+        visited.add(symbol)
+        on_path.add(symbol)
 
-        # 获取函数分析
-        analysis = self.call_graph.get(root_symbol, {}).get("analysis", {})
+        calls = self._adj.get(symbol, ())
+        analysis = self._analysis.get(symbol, _EMPTY)
+        node_id = self._node_id(symbol)
+        short_name = self._short_name(symbol)  # 简化显示名称
 
-        # 添加节点定义，包含关键操作
-        short_name = root_symbol.split("/")[-1].split(":")[0]  # 简化显示名称
-        key_ops = "<br>".join(analysis.get("key_operations", [])[:2])  # 只显示前两个关键操作
+        # 添加节点定义；流程图节点包含前两个关键操作
+        ascii_lines.append(f"{indent}└── {symbol}")
+        graph_lines.append(f"    {node_id}[\"{short_name}\"]")
+        # LLM 返回的描述可能包含换行，而 nvim_buf_set_lines 不接受带换行的行
+        key_ops = "<br>".join(" ".join(op.splitlines()) for op in analysis.get("key_operations", [])[:2])
         if key_ops:
-            lines.append(f"    {node_id}[\"{short_name}<br>{key_ops}\"]")
+            flow_lines.append(f"    {node_id}[\"{short_name}<br>{key_ops}\"]")
         else:
-            lines.append(f"    {node_id}[\"{short_name}\"]")
-
-        # 获取子调用
-        calls = self.call_graph.get(root_symbol, {}).get("calls", [])
+            flow_lines.append(f"    {node_id}[\"{short_name}\"]")
 
-        for i, call in enumerate(calls):
-            # 为子节点创建唯一ID
-            child_id = f"node_{hash(call) % 10000}"
-
-            # 添加边，包含数据流信息（如果有）
-            if "data_flow" in analysis:
-                lines.append(f"    {node_id} -->|data flow| {child_id}")
-            else:
-                lines.append(f"    {node_id} --> {child_id}")
+        # 流程图的边包含数据流信息（如果有）
+        flow_arrow = "-->|data flow|" if "data_flow" in analysis else "-->"
+        new_indent = indent + "    "
+        for call in calls:
+            child_id = self._node_id(call)
+            graph_lines.append(f"    {node_id} --> {child_id}")
+            flow_lines.append(f"    {node_id} {flow_arrow} {child_id}")
 
             # 递归生成子调用的图
-            child_lines = self._generate_mermaid_flow_chart(call, visited.copy())
-            lines.extend(child_lines)
+            self._walk(call, new_indent, visited, on_path, ascii_lines, graph_lines, flow_lines)
 
-        return lines
+        on_path.remove(symbol)
 
     def _prioritize_calls(self, calls, analysis: dict) -> list:
         """根据LLM分析结果对函数调用进行优先级排序。"""
         # 获取LLM识别的函数调用
-        important_calls = set(analysis.get("function_calls", []))
+        matcher = _build_matcher(analysis.get("function_calls", []))
 
-        # 对调用进行排序，优先处理LLM识别的重要函数
-        prioritized = []
-        other_calls = []
-
-        for call in calls:
-            uri, line, col = call
-            # 从URI中提取函数名（简化处理，实际可能需要更复杂的逻辑）
-            func_name = uri.split("/")[-1].split(".")[0]
-
-            if any(important in func_name.lower() for important in important_calls):
-                prioritized.append(call)
-            else:
-                other_calls.append(call)
-
-        # 返回排序后的调用列表
-        return prioritized + other_calls
+        # 优先处理LLM识别的重要函数；sorted 是稳定排序，同一优先级内保持原有顺序
+        return sorted(calls, key=functools.partial(_call_priority, matcher))
 
     def _called_functions(self, symbol: str) -> Iterable[Tuple[str, int, int]]:
         """Return locations of functions referenced by `symbol`."""
-        from concurrent.futures import Future
-        result_future = Future()
-
-        def on_references_result(data):
-            if data:
-                result_future.set_result(data)
-            else:
-                result_future.set_result([])
-
-        # 直接使用 plugin 实例注册回调
-        callback_id = self.plugin.register_callback(on_references_result)
-
-        # 获取当前位置的引用，传入回调ID
-        from .lua_utils.helpers import run_get_buf_references
-        run_get_buf_references(self.nvim, callback_id)
-
         try:
-            locations = result_future.result(timeout=2.0)
-
-            # 转换为需要的格式
-            result = []
-            for loc in locations:
-                uri = loc["uri"]
-                line = loc["range"]["start"]["line"] + 1
-                col = loc["range"]["start"]["character"] + 1
-                result.append((uri, line, col))
-            return result
+            # 获取当前位置的引用，一次 RPC 直接返回结果
+            locations = run_get_buf_references(self.nvim)
         except Exception as e:
             self.nvim.out_write(f"Error getting references: {e}\n")
             return []
-        finally:
-            self.plugin.unregister_callback(callback_id)
+
+        # 转换为需要的格式
+        result = []
+        append = result.append
+        for loc in locations:
+            start = loc["range"]["start"]
+            append((uri_to_path(loc["uri"]), start["line"] + 1, start["character"] + 1))
+        return result
 
 
 def traverse_project(nvim, plugin) -> TraversalManager:
@@ -0,0 +1,14 @@
+"""Conversion of LSP document URIs to local file paths."""
+from urllib.parse import unquote
+
+
+def uri_to_path(uri: str) -> str:
+    """Return the filesystem path of a ``file://`` URI."""
+    path = uri.removeprefix("file://")
+    # 只有包含转义字符时才解码
+    if "%" in path:
+        path = unquote(path)
+    # Windows 路径：file:///C:/foo -> C:/foo
+    if len(path) > 2 and path[0] == "/" and path[2] == ":":
+        path = path[1:]
+    return path
@@ -0,0 +1,46 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "rplugin/python3"))
+
+
+class DummyApi:
+    """Record ``call_atomic`` batches and answer them with ``results``/``error``."""
+
+    def __init__(self):
+        self.batches = []
+        # None 表示每个调用都返回 None
+        self.results = None
+        self.error = None
+
+    def call_atomic(self, calls):
+        self.batches.append(calls)
+        results = [None] * len(calls) if self.results is None else list(self.results)
+        return [results, self.error]
+
+
+class DummyNvim:
+    def __init__(self):
+        self.api = DummyApi()
+
+    def exec_lua(self, script):
+        return ''
+
+    def out_write(self, msg):
+        self.last_msg = msg
+
+    def err_write(self, msg):
+        self.last_err = msg
+
+    def command(self, cmd):
+        self.last_cmd = cmd
+
+    def call(self, name, *args):
+        self.last_call = (name, args)
+
+
+@pytest.fixture
+def nvim():
+    return DummyNvim()
@@ -0,0 +1,64 @@
+import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "rplugin/python3"))
+
+from callgraphite.cache import AnalysisCache
+
+
+def test_analysis_cache_persists(tmp_path):
+    path = str(tmp_path / "llm.sqlite3")
+    cache = AnalysisCache(path)
+    cache.set("key", {"summary": "cached"})
+    cache.close()
+
+    cache = AnalysisCache(path)
+    assert cache.get("key") == {"summary": "cached"}
+    assert cache.get("missing") is None
+    cache.close()
+
+
+def test_analysis_cache_expires(tmp_path):
+    cache = AnalysisCache(None, expire=-1)
+    cache.set("key", {"summary": "stale"})
+    assert cache.get("key") is None
+
+
+def test_analysis_cache_evicts_least_recently_used():
+    cache = AnalysisCache(None, max_entries=2)
+    cache.set("a", {"summary": "a"})
+    cache.set("b", {"summary": "b"})
+    cache.get("a")
+    cache.set("c", {"summary": "c"})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"summary": "a"}
+    assert cache.get("c") == {"summary": "c"}
+
+
+def test_analysis_cache_purges_expired_rows_on_open(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    AnalysisCache(path, expire=-1).set("k", {"summary": "old"})
+
+    AnalysisCache(path)
+    assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM analysis").fetchone() == (0,)
+
+
+def test_analysis_cache_falls_back_to_memory_on_corrupt_file(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    path.write_bytes(b"not a database" * 100)
+    cache = AnalysisCache(str(path))
+
+    assert cache._conn is None
+    cache.set("k", {"summary": "x"})
+    assert cache.get("k") == {"summary": "x"}
+
+
+def test_analysis_cache_errors_are_misses(tmp_path):
+    cache = AnalysisCache(str(tmp_path / "cache.sqlite3"))
+    cache._conn.execute("DROP TABLE analysis")
+
+    cache.set("k", {"summary": "x"})
+    cache._lru.clear()
+    assert cache.get("k") is None
@@ -0,0 +1,33 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "rplugin/python3"))
+
+from callgraphite import capture
+from callgraphite.lua_utils.helpers import FunctionBody
+
+
+def test_function_text_cached_until_buffer_changes(nvim, monkeypatch):
+    calls = []
+
+    def fake_body(nvim):
+        calls.append(nvim)
+        return FunctionBody(0, 0, 3, 1, ["func f() {", "    g()", "    h()", "}"])
+
+    monkeypatch.setattr(capture, "_FUNCTION_CACHE", {})
+    monkeypatch.setattr(capture, "run_get_current_function_body", fake_body)
+    # call_atomic 返回 [缓冲区, changedtick, 光标位置]
+    nvim.api.results = [1, 1, [2, 4]]
+
+    assert capture.get_current_function_text(nvim).startswith("func f()")
+    nvim.api.results = [1, 1, [3, 0]]
+    capture.get_current_function_text(nvim)
+    assert len(calls) == 1
+
+    nvim.api.results = [1, 2, [3, 0]]
+    capture.get_current_function_text(nvim)
+    assert len(calls) == 2
+
+    nvim.api.results = [1, 2, [10, 0]]
+    capture.get_current_function_text(nvim)
+    assert len(calls) == 3
@@ -0,0 +1,36 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "rplugin/python3"))
+
+from callgraphite import config
+
+
+def test_load_config_reparses_only_on_mtime_change(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.delenv("OPENAI_MODEL", raising=False)
+    config._read_config_file.cache_clear()
+
+    path = tmp_path / ".config/callgraphite/config.json"
+    path.parent.mkdir(parents=True)
+    path.write_text(json.dumps({"llm": {"model": "first"}}))
+
+    assert config.load_config()["llm"]["model"] == "first"
+    config.load_config()["llm"]["model"] = "mutated"
+    assert config.load_config()["llm"]["model"] == "first"
+    assert config._read_config_file.cache_info().misses == 1
+
+    path.write_text(json.dumps({"llm": {"model": "second"}}))
+    stat = path.stat()
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+    assert config.load_config()["llm"]["model"] == "second"
+    assert config.load_config()["llm"]["endpoint"] == config.default_config()["llm"]["endpoint"]
+
+
+def test_update_dict_merges_nested():
+    target = {"a": {"b": {"c": 1, "d": 2}}, "e": 3}
+    config._update_dict(target, {"a": {"b": {"c": 10}, "f": 4}, "e": {"g": 5}})
+    assert target == {"a": {"b": {"c": 10, "d": 2}, "f": 4}, "e": {"g": 5}}
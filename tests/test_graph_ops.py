@@ -0,0 +1,41 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "rplugin/python3"))
+
+from callgraphite.graph_ops import recursive_symbols, scc_components, tarjan_scc, to_csr
+
+
+def test_tarjan_scc_groups_cycles():
+    graph = {
+        "root": {"calls": ["a", "d"]},
+        "a": {"calls": ["b"]},
+        "b": {"calls": ["c"]},
+        "c": {"calls": ["a"]},
+        "d": {"calls": ["leaf"]},
+    }
+    symbols, indptr, indices = to_csr(graph)
+    comp, count = tarjan_scc(indptr, indices, len(symbols))
+    ids = dict(zip(symbols, (int(c) for c in comp)))
+
+    assert count == 4
+    assert ids["a"] == ids["b"] == ids["c"]
+    assert len({ids["root"], ids["a"], ids["d"], ids["leaf"]}) == 4
+
+
+def test_recursive_symbols_includes_self_calls():
+    graph = {
+        "root": {"calls": ["fact", "a"]},
+        "fact": {"calls": ["fact"]},
+        "a": {"calls": ["b"]},
+        "b": {"calls": ["a"]},
+    }
+    assert recursive_symbols(graph) == {"fact", "a", "b"}
+    assert recursive_symbols({}) == set()
+
+
+def test_scc_components_are_reverse_topological():
+    ids = scc_components({"root": {"calls": ["a", "b"]}, "a": {"calls": ["x"]}, "x": {"calls": ["b", "a"]}})
+
+    assert ids["a"] == ids["x"]
+    assert ids["b"] < ids["a"] < ids["root"]
@@ -0,0 +1,35 @@
+import sys
+from pathlib import Path
+
+import pytest
+from pynvim import NvimError
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "rplugin/python3"))
+
+from callgraphite.lua_utils.helpers import FunctionBody, call_atomic
+
+
+def _body():
+    # 函数从第 10 行第 4 列开始
+    return FunctionBody(10, 4, 12, 1, ["func f() {", "    aaa(f)", "}"])
+
+
+def test_search_first_occurrence():
+    body = _body()
+    assert body.search("f") == (10, 4)
+    assert body.search("aaa") == (11, 4)
+    assert body.search("missing") is None
+
+
+def test_search_all_overlapping():
+    body = _body()
+    assert body.search_all("aa") == [(11, 4), (11, 5)]
+    assert body.search_all("f") == [(10, 4), (10, 9), (11, 8)]
+
+
+def test_call_atomic_raises_on_error(nvim):
+    nvim.api.results = [None]
+    nvim.api.error = [1, 0, "E37: No write since last change"]
+
+    with pytest.raises(NvimError, match="at 1 \\(nvim_win_set_cursor\\): E37"):
+        call_atomic(nvim, [["nvim_cmd", [{}, {}]], ["nvim_win_set_cursor", [0, [1, 0]]]])
@@ -0,0 +1,217 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "rplugin/python3"))
+
+from callgraphite.llm import LLMClient
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.delenv("OPENAI_MODEL", raising=False)
+    with LLMClient() as llm:
+        yield llm
+
+
+def test_analyse_functions_deduplicates_requests(client, monkeypatch):
+    prompts = []
+
+    def fake_call(messages):
+        prompts.append(messages[-1]["content"])
+        return json.dumps({"summary": "b" if "func b" in messages[-1]["content"] else "a"})
+
+    monkeypatch.setattr(client, "_call_llm_api", fake_call)
+    results = client.analyse_functions(["func a() {}", "func b() {}", "func a() {}"])
+
+    assert len(prompts) == 2
+    assert results[0] == results[2]
+    assert results[0]["summary"] != results[1]["summary"]
+
+
+def test_analyse_functions_batch_single_request(client, monkeypatch):
+    requests_sent = []
+
+    def fake_call(messages, **kwargs):
+        requests_sent.append(messages)
+        count = messages[-1]["content"].count("### FUNCTION")
+        return json.dumps({"results": [{"summary": f"fn {i}"} for i in range(count)]})
+
+    monkeypatch.setattr(client, "_call_llm_api", fake_call)
+    results = client.analyse_functions_batch(["func a() {}", "func b() {}", "func c() {}"])
+
+    assert len(requests_sent) == 1
+    assert [r["summary"] for r in results] == ["fn 0", "fn 1", "fn 2"]
+    assert results[0]["function_calls"] == []
+
+
+def test_analyse_functions_batch_falls_back_on_mismatch(client, monkeypatch):
+    requests_sent = []
+
+    def fake_call(messages, **kwargs):
+        requests_sent.append(messages)
+        return json.dumps({"summary": "single"})
+
+    monkeypatch.setattr(client, "_call_llm_api", fake_call)
+    results = client.analyse_functions_batch(["func a() {}", "func b() {}"])
+
+    assert len(requests_sent) == 3
+    assert [r["summary"] for r in results] == ["single", "single"]
+
+
+def test_near_duplicate_source_hits_cache(client, monkeypatch):
+    calls = []
+
+    def fake_call(messages, **kwargs):
+        calls.append(messages)
+        return json.dumps({"summary": "cached"})
+
+    monkeypatch.setattr(client, "_call_llm_api", fake_call)
+    client.analyse_function("func a() {\n    // call b\n    b()\n}")
+    result = client.analyse_function("func a() {\n\tb()\n}")
+
+    assert len(calls) == 1
+    assert result["summary"] == "cached"
+
+
+def test_parse_response_extracts_embedded_json(client):
+    result = client._parse_analysis_response('Sure:\n```json\n{"summary": "adds numbers"}\n```')
+    assert result["summary"] == "adds numbers"
+    assert result["function_calls"] == []
+
+
+class FakeStreamResponse:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.consumed = 0
+        self.drained = False
+
+    def iter_lines(self):
+        for token in self.tokens:
+            self.consumed += 1
+            yield b"data: " + json.dumps({"choices": [{"delta": {"content": token}}]}).encode()
+        yield b"data: [DONE]"
+        self.drained = True
+
+
+def test_read_stream_stops_after_top_level_object():
+    response = FakeStreamResponse(['{"summary": ', '"uses {braces} \\"}\\""', ', "x": {}', '}', "\n\n", "trailing"])
+    text = LLMClient._read_stream(response)
+
+    assert response.consumed == 4 and not response.drained
+    assert json.loads(text) == {"summary": 'uses {braces} "}"', "x": {}}
+
+
+def test_response_format_modes(client):
+    from callgraphite.llm import ANALYSIS_SCHEMA, BATCH_SCHEMA
+
+    assert client._response_format(ANALYSIS_SCHEMA) == {"type": "json_object"}
+    client.response_format = "json_schema"
+    fmt = client._response_format(BATCH_SCHEMA)
+    assert fmt["type"] == "json_schema"
+    assert fmt["json_schema"]["schema"] is BATCH_SCHEMA
+    assert fmt["json_schema"]["strict"] is True
+
+
+def test_default_client_is_shared(tmp_path, monkeypatch):
+    from callgraphite import llm
+
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setattr(llm, "_DEFAULT", None)
+    assert llm.get_default_client() is llm.get_default_client()
+
+
+def test_default_client_is_rebuilt_when_config_changes(tmp_path, monkeypatch):
+    from callgraphite import llm
+
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.delenv("OPENAI_MODEL", raising=False)
+    monkeypatch.setattr(llm, "_DEFAULT", None)
+    first = llm.get_default_client()
+    closed = []
+    monkeypatch.setattr(first, "close", lambda: closed.append(first))
+
+    monkeypatch.setenv("OPENAI_MODEL", "other-model")
+    second = llm.get_default_client()
+
+    assert second is not first and second.model == "other-model"
+    assert closed == [first]
+    assert llm.get_default_client() is second
+
+
+def test_parse_response_skips_unparseable_braces(client, monkeypatch):
+    monkeypatch.delenv("CALLGRAPHITE_PARSE_FALLBACK", raising=False)
+    result = client._parse_analysis_response('In {this} case: {"summary": "ok", "x": "}"} done')
+    assert result["summary"] == "ok"
+    result = client._parse_analysis_response('The loop opens a { block. Result: {"summary": "ok"}')
+    assert result["summary"] == "ok"
+
+    assert client._parse_analysis_response("Summary\nno json here") is None
+    result = client._fallback_analysis("Summary\nno json here")
+    assert result == {"function_calls": [], "global_vars": [], "key_operations": [], "summary": "", "data_flow": ""}
+
+
+def test_comprehensive_analysis_is_cached(client, monkeypatch):
+    calls = []
+
+    def fake_call(messages, **kwargs):
+        calls.append(messages)
+        assert kwargs["max_tokens"] == client.comprehensive_max_tokens
+        return json.dumps({"summary": f"call {len(calls)}"})
+
+    monkeypatch.setattr(client, "_call_llm_api", fake_call)
+    subcalls = {"b": {"summary": "b"}, "a": {"summary": "a"}}
+    first = client.comprehensive_analysis("func f() {}", subcalls)
+    second = client.comprehensive_analysis("func f() {}", dict(reversed(subcalls.items())))
+    changed = client.comprehensive_analysis("func f() {}", {"a": {"summary": "changed"}})
+
+    assert first == second
+    assert changed["summary"] == "call 2"
+    assert len(calls) == 2
+
+
+def test_compact_prompt_json_trims_and_prunes():
+    from callgraphite.llm import compact_prompt_json
+
+    prompt_data = {
+        "function_source": "func f() {}",
+        "subcalls_results": {
+            "a": {"summary": "x" * 1000, "key_operations": ["1", "2", "3", "4"], "global_vars": ["G"]},
+            "b": {"summary": "short"},
+        },
+    }
+    data = json.loads(compact_prompt_json(prompt_data, "subcalls_results"))
+    assert data["subcalls_results"]["a"] == {"summary": "x" * 300, "key_operations": ["1", "2", "3"]}
+    assert data["subcalls_results"]["b"] == {"summary": "short", "key_operations": []}
+
+    text = compact_prompt_json(prompt_data, "subcalls_results", max_chars=150)
+    assert " " not in text.replace("func f() {}", "")
+    assert list(json.loads(text)["subcalls_results"]) == ["b"]
+
+
+def test_analyse_functions_batch_requests_failed_sources_once(client, monkeypatch):
+    calls = []
+
+    def fake_call(messages, **kwargs):
+        calls.append(messages)
+        raise requests.ConnectionError("down")
+
+    monkeypatch.setattr(client, "_call_llm_api", fake_call)
+    results = client.analyse_functions_batch(["func a() {}", "func b() {}"])
+
+    assert len(calls) == 3
+    assert [r["function_calls"] for r in results] == [[], []]
+
+
+def test_truncated_response_is_not_cached(client, monkeypatch):
+    responses = ['{"function_calls": ["a"], "summary": "trunc', json.dumps({"summary": "full"})]
+    monkeypatch.setattr(client, "_call_llm_api", lambda messages, **kwargs: responses.pop(0))
+
+    assert client.analyse_function("func a() {}")["summary"] == ""
+    assert client._cached("func a() {}") is None
+    assert client.analyse_function("func a() {}")["summary"] == "full"
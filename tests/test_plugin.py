@@ -0,0 +1,37 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "rplugin/python3"))
+
+from callgraphite import CallGraphitePlugin
+
+
+def _location(uri, line, character):
+    return {"uri": uri, "range": {"start": {"line": line, "character": character}}}
+
+
+def test_populate_quickfix_single_rpc(nvim):
+    CallGraphitePlugin.populate_quickfix(nvim, [
+        _location("file:///tmp/a.go", 4, 2),
+        _location("file:///tmp/b.go", 0, 0),
+    ])
+
+    assert len(nvim.api.batches) == 1
+    methods = [method for method, _ in nvim.api.batches[0]]
+    assert methods == ["nvim_cmd", "nvim_win_set_cursor", "nvim_call_function", "nvim_command"]
+    assert nvim.api.batches[0][0][1][0] == {"cmd": "edit", "args": ["/tmp/a.go"]}
+    assert nvim.api.batches[0][1][1] == [0, [5, 2]]
+    qf_list = nvim.api.batches[0][2][1][1][0]
+    assert [entry["text"] for entry in qf_list] == ["/tmp/a.go:5:3", "/tmp/b.go:1:1"]
+
+
+def test_populate_quickfix_empty(nvim):
+    CallGraphitePlugin.populate_quickfix(nvim, [])
+    assert nvim.api.batches == []
+
+
+def test_uri_to_path():
+    from callgraphite.uri import uri_to_path
+
+    assert uri_to_path("file:///tmp/a%20b.go") == "/tmp/a b.go"
+    assert uri_to_path("file:///C:/src/main.go") == "C:/src/main.go"
@@ -0,0 +1,192 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "rplugin/python3"))
+
+from callgraphite import traversal
+from callgraphite.traversal import TraversalManager
+
+
+class FakeLLM:
+    def __init__(self):
+        self.batches = []
+        self.comprehensive = []
+
+    def analyse_functions_batch(self, sources):
+        self.batches.append(sources)
+        return [{"function_calls": [], "summary": source} for source in sources]
+
+    def comprehensive_analyses(self, items):
+        self.comprehensive.append([(source, sorted(subcalls)) for source, subcalls in items])
+        return [{"summary": f"{source} + {len(subcalls)}"} for source, subcalls in items]
+
+
+# 位置 -> 该位置函数调用的其他位置
+GRAPH = {
+    ("root", 1, 1): [("a", 1, 1), ("b", 1, 1)],
+    ("a", 1, 1): [("c", 1, 1)],
+    ("b", 1, 1): [("c", 1, 1)],
+    ("c", 1, 1): [],
+}
+
+
+@pytest.fixture
+def manager(nvim, tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    manager = TraversalManager(nvim, plugin=None, llm=FakeLLM())
+    manager.jumps.push("root", 1, 1)
+
+    def current():
+        return manager.jumps.stack[manager.jumps.index]
+
+    monkeypatch.setattr(traversal, "get_current_function_text", lambda nvim: f"src {current()[0]}")
+    monkeypatch.setattr(manager, "_called_functions", lambda symbol: GRAPH[current()])
+    monkeypatch.setattr(manager, "_display_analysis", lambda *args: None)
+    return manager
+
+
+def test_visit_function_batches_per_level(manager):
+    result = manager.visit_function("<root>", "src root")
+
+    assert manager.llm.batches == [["src root"], ["src a", "src b"], ["src c"]]
+    assert manager.call_graph["<root>"]["calls"] == ["a:1:1", "b:1:1"]
+    assert manager.call_graph["a:1:1"]["calls"] == ["c:1:1"]
+    assert manager._adj["<root>"] is manager.call_graph["<root>"]["calls"]
+    assert result == {"summary": "src root + 2"}
+    assert manager.jumps.stack[manager.jumps.index] == ("root", 1, 1)
+
+
+def test_comprehensive_analysis_runs_siblings_together(manager):
+    manager.visit_function("<root>", "src root")
+
+    assert [batch for batch in manager.llm.comprehensive if batch] == [
+        [("src a", ["c:1:1"]), ("src b", ["c:1:1"])],
+        [("src root", ["a:1:1", "b:1:1"])],
+    ]
+
+
+def test_shallow_callee_finishes_before_deeper_caller(manager, monkeypatch):
+    # x 位于第三层，但调用了第二层的 b；b 的结果必须先于 x 完成
+    graph = {
+        ("root", 1, 1): [("a", 1, 1), ("b", 1, 1)],
+        ("a", 1, 1): [("x", 1, 1)],
+        ("b", 1, 1): [],
+        ("x", 1, 1): [("b", 1, 1)],
+    }
+    monkeypatch.setattr(manager, "_called_functions",
+                        lambda symbol: graph[manager.jumps.stack[manager.jumps.index]])
+    manager.visit_function("<root>", "src root")
+
+    assert [batch for batch in manager.llm.comprehensive if batch] == [
+        [("src x", ["b:1:1"])],
+        [("src a", ["x:1:1"])],
+        [("src root", ["a:1:1", "b:1:1"])],
+    ]
+    assert manager.subcalls_results["x:1:1"] == {"summary": "src x + 1"}
+
+
+def test_visualizers_expand_shared_nodes_once(manager):
+    for symbol, calls in [("root", ["a", "b"]), ("a", ["c"]), ("b", ["c"]), ("c", ["a"])]:
+        manager._record_node(symbol, calls, {})
+
+    ascii_lines, graph_lines, flow_lines = [], [], []
+    manager._walk("root", "", set(), set(), ascii_lines, graph_lines, flow_lines)
+
+    assert ascii_lines == [
+        "└── root",
+        "    └── a",
+        "        └── c",
+        "            └── a (recursive)",
+        "    └── b",
+        "        └── c (see above)",
+    ]
+    for mermaid in (graph_lines, flow_lines):
+        assert sum('["' in line for line in mermaid) == 4
+        assert sum("-->" in line for line in mermaid) == 5
+
+
+def test_node_ids_are_unique_and_stable(manager):
+    ids = [manager._node_id(f"/src/f{i}.go:1:1") for i in range(200)]
+
+    assert len(set(ids)) == 200
+    assert manager._node_id("/src/f7.go:1:1") == ids[7]
+    assert manager._short_name("/src/f7.go:1:1") == "f7.go"
+
+
+def test_generate_visualizations_single_rpc(manager):
+    sent = manager.nvim.api.batches
+    sent.clear()
+    manager._record_node("root", [], {})
+
+    manager._generate_visualizations("root")
+
+    assert len(sent) == 1
+    assert sent[0][0] == ["nvim_command", ["botright vnew CallGraphite-Visualizations"]]
+    assert sent[0][2][0] == "nvim_buf_set_lines"
+    assert sent[0][-1] == ["nvim_command", ["wincmd p"]]
+
+
+def test_display_analysis_lines(manager):
+    sent = manager.nvim.api.batches
+    sent.clear()
+    analysis = {"summary": "two\nlines", "function_calls": ["f"], "key_operations": ["op"]}
+
+    TraversalManager._display_analysis(manager, "root", analysis, {"a": {"key_operations": ["x", "y", "z"]}})
+
+    assert sent[0][2][1][4] == [
+        "# Analysis of root", "",
+        "## Summary", "two", "lines", "",
+        "## Function Calls", "- f", "",
+        "## Global Variables", "",
+        "## Key Operations", "- op",
+        "", "## Subcalls Summary",
+        "### a", "- x", "- y", "",
+    ]
+
+
+def test_prioritize_calls_matches_case_insensitively(manager):
+    calls = [("/src/util.go", 1, 1), ("/src/SendMail.go", 2, 1), ("/src/db.go", 3, 1)]
+
+    result = manager._prioritize_calls(calls, {"function_calls": ["sendmail", "DB"]})
+
+    assert result == [("/src/SendMail.go", 2, 1), ("/src/db.go", 3, 1), ("/src/util.go", 1, 1)]
+    assert manager._prioritize_calls(calls, {}) == calls
+
+
+def test_jump_stack_truncates_forward_history_and_is_bounded(nvim):
+    jumps = traversal.JumpStack(nvim)
+    for i in range(3):
+        jumps.push("f", i, 1)
+    jumps.back()
+    jumps.back()
+    jumps.push("g", 1, 1)
+
+    assert list(jumps.stack) == [("f", 0, 1), ("g", 1, 1)]
+    assert jumps.index == 1
+
+    for i in range(jumps._MAX + 10):
+        jumps.push("h", i, 1)
+    assert len(jumps.stack) == jumps._MAX
+    assert jumps.stack[jumps.index] == ("h", jumps._MAX + 9, 1)
+
+
+def test_function_text_is_fetched_once_per_location(manager, monkeypatch):
+    fetched = []
+    monkeypatch.setattr(traversal, "get_current_function_text", lambda nvim: fetched.append(1))
+
+    cache = {}
+    assert manager._function_text_at("a", 1, 1, cache) is None
+    assert manager._function_text_at("a", 1, 1, cache) is None
+    assert len(fetched) == 1
+    assert manager._function_text_at("a", 1, 1, {}) is None
+    assert len(fetched) == 2
+
+
+def test_walk_flow_lines_have_no_newlines(manager):
+    manager._record_node("root", [], {"key_operations": ["reads\nconfig", "writes"]})
+    ascii_lines, graph_lines, flow_lines = [], [], []
+    manager._walk("root", "", set(), set(), ascii_lines, graph_lines, flow_lines)
+
+    assert flow_lines == ['    node_0["root<br>reads config<br>writes"]']